@@ -0,0 +1,53 @@
+"""route covering indexes
+
+Revision ID: 3f1c2a7d9e41
+Revises: 764331a586c4
+Create Date: 2026-10-15 09:12:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9e41'
+down_revision: Union[str, Sequence[str], None] = '764331a586c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_dsa_route_date',
+            'daily_slot_agg',
+            ['origin', 'destination', sa.text('service_date DESC'), 'day_of_week'],
+            unique=False,
+            postgresql_include=['operator', 'dep_hhmm', 'n_services'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_smd_lookup',
+            'slot_metrics_daytype',
+            ['metric_date', 'model_version', 'origin', 'destination', 'day_type', 'operator', 'dep_hhmm'],
+            unique=False,
+            postgresql_include=[
+                'disruption_prob',
+                'cancellation_prob',
+                'reliability_score',
+                'effective_sample_size',
+                'confidence_band',
+            ],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_smd_lookup', table_name='slot_metrics_daytype', postgresql_concurrently=True)
+        op.drop_index('ix_dsa_route_date', table_name='daily_slot_agg', postgresql_concurrently=True)
@@ -0,0 +1,122 @@
+"""daily_slot_agg triggers
+
+Revision ID: a93d5e0c7b14
+Revises: f41a7c3e9b25
+Create Date: 2026-10-15 16:37:18.295540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93d5e0c7b14'
+down_revision: Union[str, Sequence[str], None] = 'f41a7c3e9b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Applies the signed per-slot contribution of the statement's rows (+1 new, -1 old) to
+# daily_slot_agg. {delta} is a SELECT yielding raw_service_events columns plus "sign".
+# Keys are upserted in order so concurrent ingests lock slot rows consistently.
+_APPLY_DELTA = """
+    INSERT INTO daily_slot_agg AS d (
+        service_date, operator, origin, destination, dep_hhmm, day_of_week,
+        n_services, n_cancelled, n_delayed_gt5, n_disrupted
+    )
+    SELECT
+        service_date, operator, origin, destination, dep_hhmm, day_of_week,
+        n_services, n_cancelled, n_delayed_gt5, n_cancelled + n_delayed_gt5
+    FROM (
+        SELECT
+            x.service_date,
+            x.operator,
+            x.origin,
+            x.destination,
+            x.dep_hhmm,
+            EXTRACT(DOW FROM x.service_date)::int                                            AS day_of_week,
+            SUM(x.sign)::int                                                                 AS n_services,
+            COALESCE(SUM(x.sign) FILTER (WHERE x.cancelled), 0)::int                         AS n_cancelled,
+            COALESCE(SUM(x.sign) FILTER (WHERE NOT x.cancelled AND x.arrival_delay_minutes > 5), 0)::int AS n_delayed_gt5
+        FROM ({delta}) x
+        GROUP BY 1, 2, 3, 4, 5
+    ) g
+    WHERE n_services <> 0 OR n_cancelled <> 0 OR n_delayed_gt5 <> 0
+    ORDER BY 1, 2, 3, 4, 5
+    ON CONFLICT (service_date, operator, origin, destination, dep_hhmm)
+    DO UPDATE SET
+        n_services    = d.n_services + EXCLUDED.n_services,
+        n_cancelled   = d.n_cancelled + EXCLUDED.n_cancelled,
+        n_delayed_gt5 = d.n_delayed_gt5 + EXCLUDED.n_delayed_gt5,
+        n_disrupted   = d.n_disrupted + EXCLUDED.n_disrupted;
+"""
+
+# Slots whose last service was removed/moved away
+_PRUNE_EMPTY = """
+    DELETE FROM daily_slot_agg d
+    USING old_rows o
+    WHERE d.service_date = o.service_date
+      AND d.operator = o.operator
+      AND d.origin = o.origin
+      AND d.destination = o.destination
+      AND d.dep_hhmm = o.dep_hhmm
+      AND d.n_services <= 0;
+"""
+
+_NEW = "SELECT n.*, 1 AS sign FROM new_rows n"
+_OLD = "SELECT o.*, -1 AS sign FROM old_rows o"
+
+_FUNCTIONS = {
+    "rse_rollup_insert": _APPLY_DELTA.format(delta=_NEW),
+    "rse_rollup_update": _APPLY_DELTA.format(delta=f"{_NEW} UNION ALL {_OLD}") + _PRUNE_EMPTY,
+    "rse_rollup_delete": _APPLY_DELTA.format(delta=_OLD) + _PRUNE_EMPTY,
+}
+
+# Transition tables need one trigger per event
+_TRIGGERS = [
+    ("trg_rse_rollup_insert", "INSERT", "NEW TABLE AS new_rows", "rse_rollup_insert"),
+    ("trg_rse_rollup_update", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows", "rse_rollup_update"),
+    ("trg_rse_rollup_delete", "DELETE", "OLD TABLE AS old_rows", "rse_rollup_delete"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep daily_slot_agg current as raw rows arrive, one set-based upsert per statement;
+    # the rollup job becomes a periodic reconciliation that rewrites absolute counts.
+    for name, body in _FUNCTIONS.items():
+        op.execute(
+            f"""
+            CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+            {body}
+                RETURN NULL;
+            END;
+            $$
+            """
+        )
+    for trigger, event, referencing, function in _TRIGGERS:
+        op.execute(
+            f"""
+            CREATE TRIGGER {trigger}
+            AFTER {event} ON raw_service_events
+            REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """
+        )
+
+    # Counter updates rewrite the same slot rows constantly; page headroom lets them stay HOT.
+    # HOT also needs the counters to be unindexed: ix_dsa_route_date INCLUDEs n_services and
+    # rules it out until d3b9f05a6e28 drops that index.
+    op.execute("ALTER TABLE daily_slot_agg SET (fillfactor = 70)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE daily_slot_agg RESET (fillfactor)")
+    for trigger, _, _, _ in _TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON raw_service_events")
+    for name in _FUNCTIONS:
+        op.execute(f"DROP FUNCTION IF EXISTS {name}()")
@@ -0,0 +1,82 @@
+"""reliability slot view
+
+Revision ID: b7e4d0c93a15
+Revises: 3f1c2a7d9e41
+Create Date: 2026-10-15 11:02:17.340918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4d0c93a15'
+down_revision: Union[str, Sequence[str], None] = '3f1c2a7d9e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # One row per (route, day_type, operator, dep_hhmm) seen in daily_slot_agg over the
+    # 90 days before the last refresh, with the latest v1_daytype slot metric if any.
+    # Refreshed by compute_slot_metrics_daytype; read by /v1/reliability.
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW reliability_slot_view AS
+        WITH md AS (
+          SELECT MAX(metric_date) AS metric_date
+          FROM slot_metrics_daytype
+          WHERE model_version = 'v1_daytype'
+        ),
+        freq AS (
+          SELECT
+            origin,
+            destination,
+            CASE day_of_week WHEN 0 THEN 'SUNDAY' WHEN 6 THEN 'SATURDAY' ELSE 'WEEKDAY' END AS day_type,
+            operator,
+            dep_hhmm,
+            SUM(n_services) AS n_services_90d
+          FROM daily_slot_agg
+          WHERE service_date >= (CURRENT_DATE - INTERVAL '90 days')
+          GROUP BY 1, 2, 3, 4, 5
+        )
+        SELECT
+          f.origin,
+          f.destination,
+          f.day_type,
+          f.operator,
+          f.dep_hhmm,
+          f.n_services_90d,
+          md.metric_date,
+          m.disruption_prob,
+          m.cancellation_prob,
+          m.reliability_score,
+          m.effective_sample_size,
+          m.confidence_band
+        FROM freq f
+        CROSS JOIN md
+        LEFT JOIN slot_metrics_daytype m
+          ON m.metric_date = md.metric_date
+         AND m.model_version = 'v1_daytype'
+         AND m.operator = f.operator
+         AND m.origin = f.origin
+         AND m.destination = f.destination
+         AND m.day_type = f.day_type
+         AND m.dep_hhmm = f.dep_hhmm
+        """
+    )
+    # Unique index is required for REFRESH ... CONCURRENTLY and serves the route lookup
+    op.create_index(
+        'ux_reliability_slot_view',
+        'reliability_slot_view',
+        ['origin', 'destination', 'day_type', 'operator', 'dep_hhmm'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS reliability_slot_view")
@@ -0,0 +1,145 @@
+"""dsa 90d freq
+
+Revision ID: c2a9f61e8d07
+Revises: b7e4d0c93a15
+Create Date: 2026-10-15 11:48:53.602771
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a9f61e8d07'
+down_revision: Union[str, Sequence[str], None] = 'b7e4d0c93a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_RELIABILITY_SLOT_VIEW_FROM_FREQ = """
+    CREATE MATERIALIZED VIEW reliability_slot_view AS
+    WITH md AS (
+      SELECT MAX(metric_date) AS metric_date
+      FROM slot_metrics_daytype
+      WHERE model_version = 'v1_daytype'
+    )
+    SELECT
+      f.origin,
+      f.destination,
+      f.day_type,
+      f.operator,
+      f.dep_hhmm,
+      f.n_services_90d,
+      md.metric_date,
+      m.disruption_prob,
+      m.cancellation_prob,
+      m.reliability_score,
+      m.effective_sample_size,
+      m.confidence_band
+    FROM dsa_90d_freq f
+    CROSS JOIN md
+    LEFT JOIN slot_metrics_daytype m
+      ON m.metric_date = md.metric_date
+     AND m.model_version = 'v1_daytype'
+     AND m.operator = f.operator
+     AND m.origin = f.origin
+     AND m.destination = f.destination
+     AND m.day_type = f.day_type
+     AND m.dep_hhmm = f.dep_hhmm
+"""
+
+_RELIABILITY_SLOT_VIEW_FROM_DSA = """
+    CREATE MATERIALIZED VIEW reliability_slot_view AS
+    WITH md AS (
+      SELECT MAX(metric_date) AS metric_date
+      FROM slot_metrics_daytype
+      WHERE model_version = 'v1_daytype'
+    ),
+    freq AS (
+      SELECT
+        origin,
+        destination,
+        CASE day_of_week WHEN 0 THEN 'SUNDAY' WHEN 6 THEN 'SATURDAY' ELSE 'WEEKDAY' END AS day_type,
+        operator,
+        dep_hhmm,
+        SUM(n_services) AS n_services_90d
+      FROM daily_slot_agg
+      WHERE service_date >= (CURRENT_DATE - INTERVAL '90 days')
+      GROUP BY 1, 2, 3, 4, 5
+    )
+    SELECT
+      f.origin,
+      f.destination,
+      f.day_type,
+      f.operator,
+      f.dep_hhmm,
+      f.n_services_90d,
+      md.metric_date,
+      m.disruption_prob,
+      m.cancellation_prob,
+      m.reliability_score,
+      m.effective_sample_size,
+      m.confidence_band
+    FROM freq f
+    CROSS JOIN md
+    LEFT JOIN slot_metrics_daytype m
+      ON m.metric_date = md.metric_date
+     AND m.model_version = 'v1_daytype'
+     AND m.operator = f.operator
+     AND m.origin = f.origin
+     AND m.destination = f.destination
+     AND m.day_type = f.day_type
+     AND m.dep_hhmm = f.dep_hhmm
+"""
+
+
+def _create_reliability_slot_view_index() -> None:
+    op.create_index(
+        'ux_reliability_slot_view',
+        'reliability_slot_view',
+        ['origin', 'destination', 'day_type', 'operator', 'dep_hhmm'],
+        unique=True,
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 90-day service frequency per (route, day_type, operator, dep_hhmm), so the
+    # daily_slot_agg scan/aggregate is done once per refresh rather than per view/query
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW dsa_90d_freq AS
+        SELECT
+          origin,
+          destination,
+          CASE day_of_week WHEN 0 THEN 'SUNDAY' WHEN 6 THEN 'SATURDAY' ELSE 'WEEKDAY' END AS day_type,
+          operator,
+          dep_hhmm,
+          SUM(n_services) AS n_services_90d
+        FROM daily_slot_agg
+        WHERE service_date >= (CURRENT_DATE - INTERVAL '90 days')
+        GROUP BY 1, 2, 3, 4, 5
+        """
+    )
+    op.create_index(
+        'ux_dsa_90d_freq',
+        'dsa_90d_freq',
+        ['origin', 'destination', 'day_type', 'operator', 'dep_hhmm'],
+        unique=True,
+    )
+
+    # reliability_slot_view now reads the frequencies from dsa_90d_freq
+    op.execute("DROP MATERIALIZED VIEW reliability_slot_view")
+    op.execute(_RELIABILITY_SLOT_VIEW_FROM_FREQ)
+    _create_reliability_slot_view_index()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW reliability_slot_view")
+    op.execute(_RELIABILITY_SLOT_VIEW_FROM_DSA)
+    _create_reliability_slot_view_index()
+
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS dsa_90d_freq")
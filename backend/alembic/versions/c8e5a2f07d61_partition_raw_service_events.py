@@ -0,0 +1,157 @@
+"""partition raw_service_events
+
+Revision ID: c8e5a2f07d61
+Revises: a93d5e0c7b14
+Create Date: 2026-10-15 17:24:09.518337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e5a2f07d61'
+down_revision: Union[str, Sequence[str], None] = 'a93d5e0c7b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_COLUMNS = """
+    id uuid NOT NULL,
+    service_date date NOT NULL,
+    operator text NOT NULL,
+    origin text NOT NULL,
+    destination text NOT NULL,
+    scheduled_departure_ts timestamptz NOT NULL,
+    dep_hhmm text GENERATED ALWAYS AS (
+        lpad(date_part('hour', scheduled_departure_ts AT TIME ZONE 'Europe/London')::int::text, 2, '0') ||
+        lpad(date_part('minute', scheduled_departure_ts AT TIME ZONE 'Europe/London')::int::text, 2, '0')
+    ) STORED,
+    scheduled_arrival_ts timestamptz,
+    actual_arrival_ts timestamptz,
+    cancelled boolean NOT NULL,
+    arrival_delay_minutes integer,
+    service_key text NOT NULL,
+    source_run_id uuid NOT NULL,
+    ingested_at timestamptz NOT NULL DEFAULT now(),
+    source_event_id text,
+    sourced text NOT NULL
+"""
+
+# Everything but the generated dep_hhmm
+_COPY_COLUMNS = (
+    "id, service_date, operator, origin, destination, scheduled_departure_ts, "
+    "scheduled_arrival_ts, actual_arrival_ts, cancelled, arrival_delay_minutes, "
+    "service_key, source_run_id, ingested_at, source_event_id, sourced"
+)
+
+# Monthly partitions named raw_service_events_yYYYYmMM; ingest calls this for each batch's
+# date range before inserting, so there is no DEFAULT partition to split later
+_ENSURE_PARTITIONS = """
+    CREATE FUNCTION rse_ensure_partitions(from_date date, to_date date) RETURNS void
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        m date := date_trunc('month', from_date)::date;
+        part text;
+    BEGIN
+        WHILE m <= to_date LOOP
+            part := 'raw_service_events_y' || to_char(m, 'YYYY"m"MM');
+            IF to_regclass(part) IS NULL THEN
+                BEGIN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF raw_service_events FOR VALUES FROM (%L) TO (%L)',
+                        part, m, (m + INTERVAL '1 month')::date
+                    );
+                EXCEPTION WHEN duplicate_table OR unique_violation THEN
+                    NULL;  -- a concurrent ingest created it first
+                END;
+            END IF;
+            m := (m + INTERVAL '1 month')::date;
+        END LOOP;
+    END;
+    $$
+"""
+
+# Same triggers as a93d5e0c7b14; they go away with the old table and are recreated on the
+# new one after the copy, so copied rows are not counted into daily_slot_agg twice
+_TRIGGERS = [
+    ("trg_rse_rollup_insert", "INSERT", "NEW TABLE AS new_rows", "rse_rollup_insert"),
+    ("trg_rse_rollup_update", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows", "rse_rollup_update"),
+    ("trg_rse_rollup_delete", "DELETE", "OLD TABLE AS old_rows", "rse_rollup_delete"),
+]
+
+
+def _create_indexes(*, unique_key: list[str]) -> None:
+    for column in ('destination', 'operator', 'origin', 'scheduled_departure_ts', 'service_date',
+                   'source_run_id', 'source_event_id', 'sourced', 'ingested_at'):
+        op.create_index(op.f(f'ix_raw_service_events_{column}'), 'raw_service_events', [column], unique=False)
+    op.create_index(op.f('ix_raw_service_events_service_key'), 'raw_service_events', unique_key, unique=True)
+    op.create_index(
+        'ix_raw_service_events_slot',
+        'raw_service_events',
+        ['service_date', 'operator', 'origin', 'destination', 'dep_hhmm'],
+        unique=False,
+        postgresql_include=['cancelled', 'arrival_delay_minutes'],
+    )
+
+
+def _create_triggers() -> None:
+    for trigger, event, referencing, function in _TRIGGERS:
+        op.execute(
+            f"""
+            CREATE TRIGGER {trigger}
+            AFTER {event} ON raw_service_events
+            REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Range-partition by month so service_date-bounded scans (the rollup) prune to the
+    # months they touch. Unique keys on a partitioned table must include the partition
+    # key: service_key already hashes service_date, so (service_key, service_date) is
+    # equivalent, and the primary key becomes (id, service_date).
+    op.execute("ALTER TABLE raw_service_events RENAME TO raw_service_events_old")
+    op.execute(f"CREATE TABLE raw_service_events ({_COLUMNS}) PARTITION BY RANGE (service_date)")
+    op.execute(_ENSURE_PARTITIONS)
+    op.execute(
+        """
+        SELECT rse_ensure_partitions(
+            LEAST(COALESCE(MIN(service_date), CURRENT_DATE), CURRENT_DATE),
+            (CURRENT_DATE + INTERVAL '1 year')::date
+        )
+        FROM raw_service_events_old
+        """
+    )
+    op.execute(
+        f"INSERT INTO raw_service_events ({_COPY_COLUMNS}) "
+        f"SELECT {_COPY_COLUMNS} FROM raw_service_events_old"
+    )
+    op.drop_table('raw_service_events_old')
+
+    op.create_primary_key('raw_service_events_pkey', 'raw_service_events', ['id', 'service_date'])
+    _create_indexes(unique_key=['service_key', 'service_date'])
+    _create_triggers()
+    op.execute("ANALYZE raw_service_events")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE raw_service_events RENAME TO raw_service_events_old")
+    op.execute(f"CREATE TABLE raw_service_events ({_COLUMNS})")
+    op.execute(
+        f"INSERT INTO raw_service_events ({_COPY_COLUMNS}) "
+        f"SELECT {_COPY_COLUMNS} FROM raw_service_events_old"
+    )
+    # drops the partitions with it
+    op.drop_table('raw_service_events_old')
+    op.execute("DROP FUNCTION IF EXISTS rse_ensure_partitions(date, date)")
+
+    op.create_primary_key('raw_service_events_pkey', 'raw_service_events', ['id'])
+    _create_indexes(unique_key=['service_key'])
+    _create_triggers()
+    op.execute("ANALYZE raw_service_events")
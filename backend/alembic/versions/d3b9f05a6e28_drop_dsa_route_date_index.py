@@ -0,0 +1,39 @@
+"""drop dsa route date index
+
+Revision ID: d3b9f05a6e28
+Revises: c8e5a2f07d61
+Create Date: 2026-10-16 09:12:40.281957
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3b9f05a6e28'
+down_revision: Union[str, Sequence[str], None] = 'c8e5a2f07d61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # /v1/reliability reads reliability_slot_view now, and the dsa_90d_freq refresh filters on
+    # service_date alone, so nothing reads this index; it only slowed every daily_slot_agg write
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_dsa_route_date', table_name='daily_slot_agg', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_dsa_route_date',
+            'daily_slot_agg',
+            ['origin', 'destination', sa.text('service_date DESC'), 'day_of_week'],
+            unique=False,
+            postgresql_include=['operator', 'dep_hhmm', 'n_services'],
+            postgresql_concurrently=True,
+        )
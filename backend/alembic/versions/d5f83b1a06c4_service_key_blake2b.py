@@ -0,0 +1,137 @@
+"""service key blake2b
+
+Revision ID: d5f83b1a06c4
+Revises: c2a9f61e8d07
+Create Date: 2026-10-15 14:06:21.774190
+
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Sequence, Union
+from zoneinfo import ZoneInfo
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f83b1a06c4'
+down_revision: Union[str, Sequence[str], None] = 'c2a9f61e8d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LONDON = ZoneInfo("Europe/London")
+_BATCH_SIZE = 10_000
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Frozen copies of make_service_key before/after this revision
+def _sha1_key(raw: str) -> str:
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _blake2b_key(raw: str) -> str:
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _sched_dep_isos(sched_dep: datetime) -> list[str]:
+    """
+    Every isoformat ingest can have hashed for this instant. Ingest builds the departure as a
+    London wall-clock time (hhmm_to_dt); for a wall time in the spring-forward gap that keeps
+    the pre-transition offset (01:30+00:00), while reading the instant back gives 02:30+01:00.
+    """
+    isos = [sched_dep.astimezone(LONDON).isoformat()]
+    utc_wall = sched_dep.astimezone(timezone.utc).replace(tzinfo=None)
+    # London is UTC+0 or UTC+1: rebuild the instant from both wall times the way ingest does
+    for offset_hours in (0, 1):
+        as_built = (utc_wall + timedelta(hours=offset_hours)).replace(tzinfo=LONDON)
+        # same instant iff ingest would give that wall time this offset (== would reject gap times)
+        if as_built.utcoffset() == timedelta(hours=offset_hours) and as_built.isoformat() not in isos:
+            isos.append(as_built.isoformat())
+    return isos
+
+
+def _rekey(old_key: Callable[[str], str], new_key: Callable[[str], str]) -> None:
+    """
+    Recompute raw_service_events.service_key from its identity columns and carry the
+    change over to the commute_intents references. The raw string matches what ingest
+    hashes: sched_dep_iso is the Europe/London isoformat of the scheduled departure
+    (see _sched_dep_isos).
+    """
+    bind = op.get_bind()
+    op.execute("CREATE TEMP TABLE service_key_map (old_key text PRIMARY KEY, new_key text NOT NULL)")
+
+    # Server-side cursor: the table is read in batches rather than materialised client-side
+    rows = bind.execute(
+        sa.text(
+            "SELECT origin, destination, operator, service_date, scheduled_departure_ts "
+            "FROM raw_service_events"
+        ),
+        execution_options={"yield_per": _BATCH_SIZE},
+    )
+    for batch in rows.partitions():
+        mapping = []
+        for origin, destination, operator, service_date, sched_dep in batch:
+            # one entry per possible rendering; only the one matching the stored key is used
+            for sched_dep_iso in _sched_dep_isos(sched_dep):
+                raw = f"{origin}|{destination}|{operator}|{service_date.isoformat()}|{sched_dep_iso}"
+                mapping.append({"old_key": old_key(raw), "new_key": new_key(raw)})
+        bind.execute(sa.text("INSERT INTO service_key_map (old_key, new_key) VALUES (:old_key, :new_key)"), mapping)
+
+    _apply_key_map()
+
+    # Rows whose stored key matches none of the renderings (e.g. written by older ingest code)
+    # are re-keyed from their primary rendering, the same key a re-ingest would produce
+    expected_len = len(new_key(""))
+    unmatched = bind.execute(
+        sa.text(
+            "SELECT service_key, origin, destination, operator, service_date, scheduled_departure_ts "
+            "FROM raw_service_events WHERE length(service_key) <> :expected_len"
+        ),
+        {"expected_len": expected_len},
+    ).all()
+    if unmatched:
+        logger.warning("%d raw_service_events rows matched no recomputed key; re-keying them directly", len(unmatched))
+        op.execute("TRUNCATE service_key_map")
+        mapping = []
+        for stored_key, origin, destination, operator, service_date, sched_dep in unmatched:
+            raw = f"{origin}|{destination}|{operator}|{service_date.isoformat()}|{_sched_dep_isos(sched_dep)[0]}"
+            mapping.append({"old_key": stored_key, "new_key": new_key(raw)})
+        for stored_key, origin, destination, operator, service_date, _ in unmatched[:20]:
+            logger.warning("  %s %s %s->%s %s", stored_key, service_date, origin, destination, operator)
+        bind.execute(sa.text("INSERT INTO service_key_map (old_key, new_key) VALUES (:old_key, :new_key)"), mapping)
+        _apply_key_map()
+    op.execute("DROP TABLE service_key_map")
+
+
+def _apply_key_map() -> None:
+    op.execute(
+        """
+        UPDATE raw_service_events r
+        SET service_key = m.new_key
+        FROM service_key_map m
+        WHERE r.service_key = m.old_key
+        """
+    )
+    for col in ("baseline_service_key", "alt_service_key", "final_service_key"):
+        op.execute(
+            f"""
+            UPDATE commute_intents c
+            SET {col} = m.new_key
+            FROM service_key_map m
+            WHERE c.{col} = m.old_key
+            """
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # make_service_key moved from SHA-1 (40 hex) to BLAKE2b-128 (32 hex); re-key existing rows
+    _rekey(_sha1_key, _blake2b_key)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rekey(_blake2b_key, _sha1_key)
@@ -0,0 +1,41 @@
+"""raw_service_events ingested_at index
+
+Revision ID: e8b2c47f1d93
+Revises: d5f83b1a06c4
+Create Date: 2026-10-15 15:21:09.410653
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2c47f1d93'
+down_revision: Union[str, Sequence[str], None] = 'd5f83b1a06c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves the incremental rollup's "dates touched since watermark" probe and MAX(ingested_at)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_raw_service_events_ingested_at'),
+            'raw_service_events',
+            ['ingested_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_raw_service_events_ingested_at'),
+            table_name='raw_service_events',
+            postgresql_concurrently=True,
+        )
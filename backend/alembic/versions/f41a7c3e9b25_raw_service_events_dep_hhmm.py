@@ -0,0 +1,117 @@
+"""raw_service_events dep_hhmm
+
+Revision ID: f41a7c3e9b25
+Revises: e8b2c47f1d93
+Create Date: 2026-10-15 15:52:44.062318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41a7c3e9b25'
+down_revision: Union[str, Sequence[str], None] = 'e8b2c47f1d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# What the rollup grouped on before this revision: the departure formatted in the session time zone
+_SESSION_TZ_HHMM = "to_char(scheduled_departure_ts, 'HH24MI')"
+
+# Same aggregation as app.jobs.rollup.daily_slot_agg, restricted to the dates in affected_dates
+_REAGGREGATE_SQL = """
+    INSERT INTO daily_slot_agg (
+        service_date, operator, origin, destination, dep_hhmm, day_of_week,
+        n_services, n_cancelled, n_delayed_gt5, n_disrupted
+    )
+    SELECT
+        r.service_date,
+        r.operator,
+        r.origin,
+        r.destination,
+        {dep_hhmm},
+        EXTRACT(DOW FROM r.service_date)::int,
+        COUNT(*)::int,
+        SUM(CASE WHEN r.cancelled THEN 1 ELSE 0 END)::int,
+        SUM(
+            CASE
+                WHEN NOT r.cancelled AND r.arrival_delay_minutes IS NOT NULL AND r.arrival_delay_minutes > 5
+                THEN 1 ELSE 0
+            END
+        )::int,
+        SUM(
+            CASE
+                WHEN r.cancelled
+                 OR (NOT r.cancelled AND r.arrival_delay_minutes IS NOT NULL AND r.arrival_delay_minutes > 5)
+                THEN 1 ELSE 0
+            END
+        )::int
+    FROM raw_service_events r
+    JOIN affected_dates a USING (service_date)
+    GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+
+def _reaggregate(dep_hhmm: str) -> None:
+    """
+    Rebuild daily_slot_agg for every service_date where the session-time-zone HHMM and the
+    London dep_hhmm column disagree (BST dates under a UTC session); other dates are identical
+    either way. dsa_90d_freq / reliability_slot_view and slot_metrics pick the change up on
+    the next compute_slot_metrics_daytype run.
+    """
+    op.execute(
+        f"""
+        CREATE TEMP TABLE affected_dates AS
+        SELECT DISTINCT service_date
+        FROM raw_service_events
+        WHERE dep_hhmm <> {_SESSION_TZ_HHMM}
+        """
+    )
+    op.execute("DELETE FROM daily_slot_agg d USING affected_dates a WHERE d.service_date = a.service_date")
+    op.execute(_REAGGREGATE_SQL.format(dep_hhmm=dep_hhmm))
+    op.execute("DROP TABLE affected_dates")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored slot key so the rollup groups on a column instead of formatting every row.
+    # Generated columns must be IMMUTABLE (to_char is only STABLE), hence date_part/lpad.
+    op.add_column(
+        'raw_service_events',
+        sa.Column(
+            'dep_hhmm',
+            sa.Text(),
+            sa.Computed(
+                "lpad(date_part('hour', scheduled_departure_ts AT TIME ZONE 'Europe/London')::int::text, 2, '0') || "
+                "lpad(date_part('minute', scheduled_departure_ts AT TIME ZONE 'Europe/London')::int::text, 2, '0')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+
+    # Existing slot rows for BST dates were keyed by the session-time-zone HHMM
+    _reaggregate("r.dep_hhmm")
+
+    # Covers the rollup's GROUP BY key and aggregated columns
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_raw_service_events_slot',
+            'raw_service_events',
+            ['service_date', 'operator', 'origin', 'destination', 'dep_hhmm'],
+            unique=False,
+            postgresql_include=['cancelled', 'arrival_delay_minutes'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_raw_service_events_slot', table_name='raw_service_events', postgresql_concurrently=True)
+    # Back to the session-time-zone HHMM the rollup uses again after this downgrade
+    _reaggregate(_SESSION_TZ_HHMM)
+    op.drop_column('raw_service_events', 'dep_hhmm')
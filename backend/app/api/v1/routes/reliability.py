@@ -2,41 +2,113 @@ from __future__ import annotations
 
 from datetime import date, datetime, time, timedelta
 from typing import Optional
+from zoneinfo import ZoneInfo
 
-import pytz
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy import TextClause, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import get_db
+from app.core.result_cache import route_baseline_cache
 from app.api.v1.schemas.reliability import DepartureReliability
 
 router = APIRouter(prefix="/v1", tags=["reliability"])
 
-LONDON = pytz.timezone("Europe/London")
-
-
-def day_type_for_date(d: date) -> str:
-    # Python weekday: Mon=0..Sun=6
-    wd = d.weekday()
-    if 0 <= wd <= 4:
-        return "WEEKDAY"
-    if wd == 5:
-        return "SATURDAY"
-    return "SUNDAY"
+LONDON = ZoneInfo("Europe/London")
+
+
+# Indexed by Python weekday: Mon=0..Sun=6
+_DAY_TYPE = ("WEEKDAY", "WEEKDAY", "WEEKDAY", "WEEKDAY", "WEEKDAY", "SATURDAY", "SUNDAY")
+
+
+_METRIC_DATE_LATEST_SQL = """
+      SELECT MAX(metric_date) AS metric_date
+      FROM slot_metrics_daytype
+      WHERE model_version = :model_version
+"""
+_METRIC_DATE_BOUND_SQL = "SELECT (:metric_date)::date AS metric_date"
+
+_BASELINE_SQL = """
+      SELECT
+        AVG(m.disruption_prob) AS disruption_prob,
+        AVG(m.cancellation_prob) AS cancellation_prob
+      FROM slot_metrics_daytype m
+      JOIN md ON m.metric_date = md.metric_date
+      WHERE m.model_version = :model_version
+        AND m.origin = :origin
+        AND m.destination = :destination
+        AND m.day_type = :day_type
+        AND ((:operator)::text IS NULL OR m.operator = (:operator)::text)
+"""
+_BASELINE_SKIPPED_SQL = "SELECT NULL::float8 AS disruption_prob, NULL::float8 AS cancellation_prob"
+
+
+def _reliability_sql(md_sql: str, baseline_sql: str) -> TextClause:
+    # metric_date, the route baseline and candidate dep_hhmm (with slot metric, if any)
+    # inside the window from reliability_slot_view, in one round-trip.
+    # One row per (dep_hhmm, operator); slot columns are NULL where no metric
+    # exists and dep_hhmm is NULL when there are no candidates at all.
+    return text(
+        f"""
+    WITH md AS (
+      {md_sql}
+    ),
+    baseline AS (
+      -- Baseline fallback (operator+day_type+route)
+      {baseline_sql}
+    ),
+    v AS (
+      -- Candidates (90d frequency) with their slot metric, precomputed per
+      -- (route, day_type, operator, dep_hhmm) by compute_slot_metrics_daytype
+      SELECT
+        dep_hhmm,
+        operator,
+        disruption_prob,
+        cancellation_prob,
+        reliability_score,
+        effective_sample_size,
+        confidence_band,
+        SUM(n_services_90d) OVER (PARTITION BY dep_hhmm) AS n_services_hhmm
+      FROM reliability_slot_view
+      WHERE origin = :origin
+        AND destination = :destination
+        AND day_type = :day_type
+        AND ((:operator)::text IS NULL OR operator = (:operator)::text)
+        AND dep_hhmm BETWEEN :win_lo AND :win_hi
+    )
+    SELECT
+      md.metric_date,
+      b.disruption_prob AS baseline_disruption_prob,
+      b.cancellation_prob AS baseline_cancellation_prob,
+      v.dep_hhmm,
+      v.operator,
+      v.disruption_prob,
+      v.cancellation_prob,
+      v.reliability_score,
+      v.effective_sample_size,
+      v.confidence_band
+    FROM md
+    CROSS JOIN baseline b
+    LEFT JOIN v ON v.n_services_hhmm >= :min_services
+    ORDER BY v.dep_hhmm
+        """
+    )
 
 
-def dow_filter_sql(day_type: str) -> str:
-    # daily_slot_agg uses Postgres DOW: 0=Sunday..6=Saturday
-    if day_type == "WEEKDAY":
-        return "day_of_week BETWEEN 1 AND 5"
-    if day_type == "SATURDAY":
-        return "day_of_week = 6"
-    return "day_of_week = 0"
+# Built once at import so the statement text is stable across requests.
+# The cached variant takes metric_date as a bind and skips the baseline AVG.
+_RELIABILITY_SQL = _reliability_sql(_METRIC_DATE_LATEST_SQL, _BASELINE_SQL)
+_RELIABILITY_SQL_CACHED = _reliability_sql(_METRIC_DATE_BOUND_SQL, _BASELINE_SKIPPED_SQL)
 
 
-@router.get("/reliability", response_model=list[DepartureReliability])
-def get_reliability(
+# Responses are built with model_construct from our own rows, so re-validating them
+# is pure overhead: response_model=None skips it, `responses` keeps the OpenAPI schema.
+@router.get(
+    "/reliability",
+    response_model=None,
+    responses={200: {"model": list[DepartureReliability]}},
+)
+async def get_reliability(
     from_loc: str = Query(..., min_length=3, max_length=3),
     to_loc: str = Query(..., min_length=3, max_length=3),
     date_str: str = Query(..., description="YYYY-MM-DD"),
@@ -44,7 +116,7 @@ def get_reliability(
     operator: Optional[str] = Query(None, description="Optional TOC code e.g. GW"),
     window_minutes: int = Query(120, ge=30, le=360),
     min_services: int = Query(10, ge=1, le=200, description="Min historical services (90d) to include dep_hhmm"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     # Parse date + arrive_by
     try:
@@ -58,131 +130,76 @@ def get_reliability(
     except Exception:
         raise HTTPException(status_code=400, detail="arrive_by must be HH:MM")
 
-    day_type = day_type_for_date(d)
-    dow_filter = dow_filter_sql(day_type)
+    day_type = _DAY_TYPE[d.weekday()]
 
-    # Define time window for candidate departures (simple MVP)
-    arrive_dt = LONDON.localize(datetime.combine(d, arrive_t))
+    # Define time window for candidate departures (simple MVP).
+    # dep_hhmm is zero-padded HHMM, so the window is a plain string range;
+    # same-day only, so a window reaching back past midnight starts at 0000.
+    arrive_dt = datetime.combine(d, arrive_t, tzinfo=LONDON)
     window_start = arrive_dt - timedelta(minutes=window_minutes)
-
-    # latest metric date (for daytype table)
-    metric_date = db.execute(text("SELECT MAX(metric_date) FROM slot_metrics_daytype")).scalar_one_or_none()
-    if metric_date is None:
-        raise HTTPException(status_code=500, detail="No slot_metrics_daytype found. Run compute job.")
-
-    # 1) Candidate dep_hhmm list (from daily_slot_agg frequency)
-    candidates_sql = text(
-        f"""
-        SELECT dep_hhmm
-        FROM daily_slot_agg
-        WHERE origin = :origin
-          AND destination = :destination
-          AND service_date >= (CURRENT_DATE - INTERVAL '90 days')
-          AND ({dow_filter})
-          AND ((:operator)::text IS NULL OR operator = (:operator)::text)
-        GROUP BY dep_hhmm
-        HAVING SUM(n_services) >= :min_services
-        ORDER BY dep_hhmm
-        """
-    )
-
-    dep_rows = db.execute(
-        candidates_sql,
-        {"origin": from_loc, "destination": to_loc, "operator": operator, "min_services": min_services},
-    ).all()
-
-    dep_hhmms = [r[0] for r in dep_rows]
-
-    # Filter to the requested window using the user’s selected date
-    filtered_hhmms: list[str] = []
-    for hhmm in dep_hhmms:
-        dep_time = time(int(hhmm[:2]), int(hhmm[2:]))
-        dep_dt = LONDON.localize(datetime.combine(d, dep_time))
-        if window_start <= dep_dt <= arrive_dt:
-            filtered_hhmms.append(hhmm)
-
-    if not filtered_hhmms:
+    win_lo = window_start.strftime("%H%M") if window_start.date() == d else "0000"
+    win_hi = arrive_dt.strftime("%H%M")
+
+    # metric_date + route baseline only change when the compute job runs, so they
+    # are cached per route and invalidated by its NOTIFY (see app.core.result_cache).
+    cache_key = (from_loc, to_loc, day_type, operator)
+    cached = route_baseline_cache.get(cache_key)
+
+    reliability_sql = _RELIABILITY_SQL if cached is None else _RELIABILITY_SQL_CACHED
+
+    params = {
+        "model_version": "v1_daytype",
+        "origin": from_loc,
+        "destination": to_loc,
+        "day_type": day_type,
+        "operator": operator,
+        "min_services": min_services,
+        "win_lo": win_lo,
+        "win_hi": win_hi,
+    }
+    if cached is not None:
+        params["metric_date"] = cached[0]
+
+    result = await db.execute(reliability_sql, params)
+    rows = result.mappings().all()
+
+    if cached is None:
+        metric_date = rows[0]["metric_date"]
+        if metric_date is None:
+            raise HTTPException(status_code=500, detail="No slot_metrics_daytype found. Run compute job.")
+
+        baseline_disruption = float(rows[0]["baseline_disruption_prob"] or 0.0)
+        baseline_cancel = float(rows[0]["baseline_cancellation_prob"] or 0.0)
+        route_baseline_cache.set(cache_key, (metric_date, baseline_disruption, baseline_cancel))
+    else:
+        _, baseline_disruption, baseline_cancel = cached
+
+    dep_hhmms: list[str] = []
+    by_hhmm = {}
+    for r in rows:
+        hhmm = r["dep_hhmm"]
+        if hhmm is None:
+            continue
+        if not dep_hhmms or dep_hhmms[-1] != hhmm:
+            dep_hhmms.append(hhmm)
+        if r["disruption_prob"] is not None:
+            by_hhmm[hhmm] = r
+
+    if not dep_hhmms:
         return []
 
-    # 2) Fetch slot metrics for those dep_hhmm
-    # We fetch all matching rows and build a map dep_hhmm -> metric row.
-    metrics_sql = text(
-        """
-        SELECT
-          operator,
-          dep_hhmm,
-          disruption_prob,
-          cancellation_prob,
-          reliability_score,
-          effective_sample_size,
-          confidence_band
-        FROM slot_metrics_daytype
-        WHERE metric_date = :metric_date
-          AND model_version = :model_version
-          AND origin = :origin
-          AND destination = :destination
-          AND day_type = :day_type
-          AND ((:operator)::text IS NULL OR operator = (:operator)::text)
-          AND dep_hhmm = ANY(:dep_hhmms)
-        """
-    )
-
-    rows = db.execute(
-        metrics_sql,
-        {
-            "metric_date": metric_date,
-            "model_version": "v1_daytype",
-            "origin": from_loc,
-            "destination": to_loc,
-            "day_type": day_type,
-            "operator": operator,
-            "dep_hhmms": filtered_hhmms,
-        },
-    ).mappings().all()
-
-    by_hhmm = {r["dep_hhmm"]: r for r in rows}
-
-    # 3) Baseline fallback (operator+day_type+route)
-    baseline_sql = text(
-        """
-        SELECT
-          AVG(disruption_prob) AS disruption_prob,
-          AVG(cancellation_prob) AS cancellation_prob
-        FROM slot_metrics_daytype
-        WHERE metric_date = :metric_date
-          AND model_version = :model_version
-          AND origin = :origin
-          AND destination = :destination
-          AND day_type = :day_type
-          AND ((:operator)::text IS NULL OR operator = (:operator)::text)
-        """
-    )
-    baseline = db.execute(
-        baseline_sql,
-        {
-            "metric_date": metric_date,
-            "model_version": "v1_daytype",
-            "origin": from_loc,
-            "destination": to_loc,
-            "day_type": day_type,
-            "operator": operator,
-        },
-    ).mappings().one()
-
-    baseline_disruption = float(baseline["disruption_prob"] or 0.0)
-    baseline_cancel = float(baseline["cancellation_prob"] or 0.0)
     baseline_score = int(round(100.0 * (1.0 - baseline_disruption)))
 
-    # 4) Build response (slot metric if exists; else baseline)
+    # Build response (slot metric if exists; else baseline)
     out: list[DepartureReliability] = []
-    for hhmm in filtered_hhmms:
+    for hhmm in dep_hhmms:
         dep_time = time(int(hhmm[:2]), int(hhmm[2:]))
-        dep_dt = LONDON.localize(datetime.combine(d, dep_time))
+        dep_dt = datetime.combine(d, dep_time, tzinfo=LONDON)
 
         m = by_hhmm.get(hhmm)
         if m:
             out.append(
-                DepartureReliability(
+                DepartureReliability.model_construct(
                     departure_time=dep_dt.isoformat(),
                     dep_hhmm=hhmm,
                     operator=m["operator"],
@@ -196,7 +213,7 @@ def get_reliability(
             )
         else:
             out.append(
-                DepartureReliability(
+                DepartureReliability.model_construct(
                     departure_time=dep_dt.isoformat(),
                     dep_hhmm=hhmm,
                     operator=operator,
@@ -1,8 +1,5 @@
-from app.core.db import SessionLocal
+from app.core.db import AsyncSessionLocal
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,80 @@
+"""
+In-process cache for per-route values that only change when the metrics job runs.
+
+Entries expire after a TTL and are also dropped as soon as the compute job
+announces a refresh with NOTIFY on SLOT_METRICS_REFRESHED_CHANNEL.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Hashable, Optional
+
+import psycopg
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+SLOT_METRICS_REFRESHED_CHANNEL = "slot_metrics_refreshed"
+
+
+class TTLCache:
+    def __init__(self, *, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        expires_at, value = hit
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if len(self._data) >= self.maxsize and key not in self._data:
+            # dicts keep insertion order: evict the oldest entry
+            self._data.pop(next(iter(self._data)), None)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+# (origin, destination, day_type, operator) -> (metric_date, baseline_disruption, baseline_cancel)
+route_baseline_cache = TTLCache(maxsize=10_000, ttl=600.0)
+
+
+def _libpq_url(database_url: str) -> str:
+    # DATABASE_URL is a SQLAlchemy URL (postgresql+psycopg://...); psycopg wants plain libpq
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+async def listen_for_slot_metrics_refresh(database_url: str, *, reconnect_delay: float = 5.0) -> None:
+    """
+    Clear route_baseline_cache whenever the compute job NOTIFYs a refresh.
+    Runs until cancelled; reconnects (and clears, since notifications may have been missed)
+    if the LISTEN connection drops.
+    """
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(_libpq_url(database_url), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {SLOT_METRICS_REFRESHED_CHANNEL}")
+                route_baseline_cache.clear()
+                logger.info("Listening on %s", SLOT_METRICS_REFRESHED_CHANNEL)
+
+                async for notify in conn.notifies():
+                    logger.info("slot metrics refreshed (metric_date=%s); clearing route cache", notify.payload)
+                    route_baseline_cache.clear()
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("LISTEN %s failed: %r; retrying in %.0fs", SLOT_METRICS_REFRESHED_CHANNEL, e, reconnect_delay)
+            route_baseline_cache.clear()
+            await asyncio.sleep(reconnect_delay)
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 import argparse
-import subprocess
-import sys
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from typing import Iterable
+
+from app.core.db import SessionLocal
+from app.jobs.compute_slot_metrics.compute_slot_metrics import compute_slot_metrics
+from app.jobs.ingest.run_ingest import IngestArgs, run_ingest
+from app.jobs.ingest.sources.hsp.config import load_config
+from app.jobs.rollup.run_daily_slot_agg import RollupArgs, run_rollup
 
 DAY_MODES_ALL = ("WEEKDAY", "SATURDAY", "SUNDAY")
 
@@ -20,6 +25,7 @@ class BackfillConfig:
     toc: list[str]
     chunk_days: int
     lookback_days: int
+    concurrency: int
     # metrics runner args
     model_version: str
     half_life_days: float
@@ -36,22 +42,62 @@ def validate_hhmm(value: str) -> str:
     return v
 
 
-def iter_date_chunks(start: date, end: date, chunk_days: int) -> Iterable[tuple[date, date]]:
-    cur = start
-    while cur <= end:
-        chunk_end = min(cur + timedelta(days=chunk_days - 1), end)
-        yield cur, chunk_end
-        cur = chunk_end + timedelta(days=1)
+def date_chunks(start: date, end: date, chunk_days: int) -> list[tuple[date, date]]:
+    # inclusive [start, end] split into chunk_days-long (chunk_start, chunk_end) pairs
+    n_days = (end - start).days + 1
+    return [
+        (start + timedelta(days=offset), start + timedelta(days=min(offset + chunk_days, n_days) - 1))
+        for offset in range(0, n_days, chunk_days)
+    ]
+
+
+def _init_worker(rate_per_second: float, rate_burst: int) -> None:
+    # Each worker process has its own HSP token bucket; give each its share of the configured rate
+    os.environ["HSP_RATE_PER_SECOND"] = str(rate_per_second)
+    os.environ["HSP_RATE_BURST"] = str(rate_burst)
 
 
-def run_module(module: str, args: list[str]) -> None:
+def _run_chunk(chunk_start: date, chunk_end: date, config: BackfillConfig) -> None:
     """
-    Runs: <current python> -m <module> <args...>
-    Using sys.executable ensures we run inside the same interpreter (pipenv run python).
+    ingest (every day_mode) -> one rollup for a date chunk. Runs in a worker process;
+    the stages are called in-process so each worker imports the app and opens
+    its connection pool once, then reuses them for every chunk it handles.
     """
-    cmd = [sys.executable, "-m", module, *args]
-    print("\n$ " + " ".join(cmd))
-    subprocess.run(cmd, check=True)
+    from_date = chunk_start.isoformat()
+    to_date = chunk_end.isoformat()
+
+    db = SessionLocal()
+    try:
+        # 1) INGEST: Darwin HSP -> raw_service_events
+        for day_mode in config.day_modes:
+            ingest_args = IngestArgs(
+                source="hsp",
+                from_loc=config.from_loc,
+                to_loc=config.to_loc,
+                from_date=from_date,
+                to_date=to_date,
+                from_time=config.from_time,
+                to_time=config.to_time,
+                days=day_mode,
+                toc=config.toc or None,
+            )
+            print(f"\n[{day_mode} {from_date}..{to_date}] ingest")
+            print(run_ingest(ingest_args, db))
+
+        # 2) ROLLUP: raw_service_events -> daily_slot_agg
+        # Not day_mode filtered, so once per chunk covers every mode ingested above
+        rollup_args = RollupArgs(
+            from_date=from_date,
+            to_date=to_date,
+            origin=config.from_loc,
+            destination=config.to_loc,
+            # Filter operator only if a single TOC specified (optional speed-up)
+            operator=config.toc[0] if len(config.toc) == 1 else None,
+        )
+        print(f"\n[{from_date}..{to_date}] rollup")
+        print(run_rollup(rollup_args, db))
+    finally:
+        db.close()
 
 
 def backfill(config: BackfillConfig) -> None:
@@ -59,66 +105,63 @@ def backfill(config: BackfillConfig) -> None:
     start = today - timedelta(days=config.lookback_days)
     end = today - timedelta(days=1)
 
-    for day_mode in config.day_modes:
-        print("\n==============================")
-        print(f" BACKFILL: {day_mode}")
-        print(f" Corridor: {config.from_loc} -> {config.to_loc}")
-        print(f" Dates:    {start.isoformat()} -> {end.isoformat()} (lookback={config.lookback_days}d)")
-        print(f" Times:    {config.from_time} -> {config.to_time}")
-        print(f" TOC:      {config.toc or 'None'}")
-        print(f" Chunk:    {config.chunk_days} days")
-        print("==============================")
-
-        for chunk_start, chunk_end in iter_date_chunks(start, end, config.chunk_days):
-            from_date = chunk_start.isoformat()
-            to_date = chunk_end.isoformat()
-
-            # 1) INGEST: Darwin HSP -> raw_service_events
-            ingest_args = [
-                "--source", "hsp",
-                "--from-loc", config.from_loc,
-                "--to-loc", config.to_loc,
-                "--from-date", from_date,
-                "--to-date", to_date,
-                "--from-time", config.from_time,
-                "--to-time", config.to_time,
-                "--days", day_mode,
-            ]
-            for toc in config.toc:
-                ingest_args += ["--toc", toc]
-
-            run_module("app.jobs.ingest.run_ingest", ingest_args)
-
-            # 2) ROLLUP: raw_service_events -> daily_slot_agg
-            # Your CLI uses --from-loc/--to-loc (dest origin/destination)
-            rollup_args = [
-                "--from-date", from_date,
-                "--to-date", to_date,
-                "--from-loc", config.from_loc,
-                "--to-loc", config.to_loc,
-            ]
-            # Filter operator only if a single TOC specified (optional speed-up)
-            if len(config.toc) == 1:
-                rollup_args += ["--operator", config.toc[0]]
-
-            run_module("app.jobs.rollup.run_daily_slot_agg", rollup_args)
-
-    # 3) METRICS: daily_slot_agg -> slot_metrics (run once at end)
-    metrics_args = [
-        "--metric-date", today.isoformat(),
-        "--from-loc", config.from_loc,
-        "--to-loc", config.to_loc,
-        "--model-version", config.model_version,
-        "--window-days", str(config.lookback_days),
-        "--half-life-days", str(config.half_life_days),
-        "--prior-strength", str(config.prior_strength),
-    ]
-    run_module("app.jobs.compute_slot_metrics.run_compute_slot_metrics", metrics_args)
+    print("\n==============================")
+    print(f" BACKFILL: {', '.join(config.day_modes)}")
+    print(f" Corridor: {config.from_loc} -> {config.to_loc}")
+    print(f" Dates:    {start.isoformat()} -> {end.isoformat()} (lookback={config.lookback_days}d)")
+    print(f" Times:    {config.from_time} -> {config.to_time}")
+    print(f" TOC:      {config.toc or 'None'}")
+    print(f" Chunk:    {config.chunk_days} days")
+    print(f" Workers:  {config.concurrency}")
+    print("==============================")
+
+    chunks = date_chunks(start, end, config.chunk_days)
+
+    # HSP_RATE_PER_SECOND / HSP_RATE_BURST are totals for the whole backfill, split across workers
+    workers = max(1, config.concurrency)
+    hsp_cfg = load_config()
+    rate_per_second = hsp_cfg.rate_per_second / workers
+    rate_burst = max(1, hsp_cfg.rate_burst // workers)
+
+    # Chunks cover disjoint dates, so their rollups never touch the same slot rows;
+    # overlap HSP network time (ingest) with DB time (rollup)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(rate_per_second, rate_burst),
+    ) as ex:
+        futures = [ex.submit(_run_chunk, chunk_start, chunk_end, config) for chunk_start, chunk_end in chunks]
+        for f in as_completed(futures):
+            try:
+                f.result()
+            except BaseException:
+                # fail fast (e.g. CircuitOpenError on a dead upstream): don't start the queued chunks
+                ex.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    # 3) METRICS: daily_slot_agg -> slot_metrics (run once at end, after the pool drains)
+    db = SessionLocal()
+    try:
+        print("\nmetrics")
+        res = compute_slot_metrics(
+            db,
+            metric_date=today,
+            model_version=config.model_version,
+            window_days=config.lookback_days,
+            half_life_days=config.half_life_days,
+            prior_strength=config.prior_strength,
+            origin=config.from_loc,
+            destination=config.to_loc,
+            commit=True,
+        )
+        print(res)
+    finally:
+        db.close()
 
 
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(
-        description="Backfill HSP by running existing scripts as subprocesses (ingest, rollup, metrics)."
+        description="Backfill HSP by running the ingest, rollup and metrics jobs in-process."
     )
     p.add_argument("--from-loc", default="RDG", help="Origin CRS (default: RDG)")
     p.add_argument("--to-loc", default="PAD", help="Destination CRS (default: PAD)")
@@ -126,6 +169,12 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument("--to-time", default="2359", type=validate_hhmm)
     p.add_argument("--lookback-days", type=int, default=90)
     p.add_argument("--chunk-days", type=int, default=7)
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Date chunks processed in parallel (default: 4); HSP_RATE_PER_SECOND is shared between them",
+    )
 
     day_group = p.add_mutually_exclusive_group()
     day_group.add_argument("--weekday-only", action="store_true")
@@ -160,6 +209,7 @@ def main():
         toc=args.toc or [],
         chunk_days=args.chunk_days,
         lookback_days=args.lookback_days,
+        concurrency=args.concurrency,
         model_version=args.model_version,
         half_life_days=args.half_life_days,
         prior_strength=args.prior_strength,
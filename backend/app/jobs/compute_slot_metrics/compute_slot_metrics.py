@@ -1,18 +1,13 @@
 from __future__ import annotations
 
-import uuid
 from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from typing import Optional
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from app.models.job_runs import JobRun
-from app.scoring.v1.slot_metrics import (
-    accumulate_weighted_counts,
-    compute_slot_metric,
-)
+from app.jobs.job_runs import finish_job, start_job
 
 
 @dataclass(frozen=True)
@@ -27,88 +22,142 @@ class ComputeSlotMetricsResult:
 
 
 # --- SQL ---
-# Pull daily_slot_agg rows in a window with optional filters (corridor/operator)
-_SELECT_DAILY_ROWS = text(
-    """
-    SELECT
-      service_date,
-      operator,
-      origin,
-      destination,
-      dep_hhmm,
-      day_of_week,
-      n_services,
-      n_cancelled,
-      n_disrupted
-    FROM daily_slot_agg
-    WHERE service_date >= :from_date
-      AND service_date <= :to_date
-      AND ((:operator)::text IS NULL OR operator = (:operator)::text)
-      AND ((:origin)::text IS NULL OR origin = (:origin)::text)
-      AND ((:destination)::text IS NULL OR destination = (:destination)::text)
-    ORDER BY service_date ASC
-    """
-)
-
-# Upsert into slot_metrics (assumes PK on these columns)
-_UPSERT_SLOT_METRICS = text(
+# Weighted aggregation, Beta-Binomial smoothing and scoring in one statement.
+# Mirrors app.scoring.v1.slot_metrics (exp_recency_weight, beta_binomial_smooth,
+# compute_slot_metric, confidence_band) so no daily rows are shipped to Python.
+_COMPUTE_SLOT_METRICS_SQL = text(
     """
-    INSERT INTO slot_metrics (
-      metric_date,
-      model_version,
-      operator,
-      origin,
-      destination,
-      day_of_week,
-      dep_hhmm,
-      disruption_prob,
-      cancellation_prob,
-      reliability_score,
-      effective_sample_size,
-      confidence_band
+    WITH day_weight AS (
+      -- recency weight depends only on the day's age: one exp() per day in the window,
+      -- not one per daily_slot_agg row
+      SELECT
+        d::date AS service_date,
+        CASE
+          WHEN (:half_life_days)::float8 > 0
+          THEN exp(
+            -ln(2.0::float8)
+            * GREATEST((:metric_date)::date - d::date, 0)
+            / (:half_life_days)::float8
+          )
+          ELSE 1.0::float8
+        END AS w
+      FROM generate_series((:from_date)::date, (:to_date)::date, INTERVAL '1 day') AS d
+    ),
+    weighted AS (
+      SELECT
+        operator,
+        origin,
+        destination,
+        day_of_week,
+        dep_hhmm,
+        n_services,
+        n_cancelled,
+        n_disrupted,
+        dw.w
+      FROM daily_slot_agg
+      JOIN day_weight dw USING (service_date)
+      WHERE service_date >= :from_date
+        AND service_date <= :to_date
+        AND ((:operator)::text IS NULL OR operator = (:operator)::text)
+        AND ((:origin)::text IS NULL OR origin = (:origin)::text)
+        AND ((:destination)::text IS NULL OR destination = (:destination)::text)
+    ),
+    op_prior AS (
+      -- operator baseline (unsmoothed) across *all* slots for that operator
+      SELECT
+        operator,
+        COALESCE(SUM(w * n_disrupted) / NULLIF(SUM(w * n_services), 0), 0.0) AS prior_d,
+        COALESCE(SUM(w * n_cancelled) / NULLIF(SUM(w * n_services), 0), 0.0) AS prior_c
+      FROM weighted
+      GROUP BY operator
+    ),
+    slot AS (
+      SELECT
+        operator,
+        origin,
+        destination,
+        day_of_week,
+        dep_hhmm,
+        SUM(w * n_services)  AS ws,
+        SUM(w * n_disrupted) AS wd,
+        SUM(w * n_cancelled) AS wc
+      FROM weighted
+      GROUP BY operator, origin, destination, day_of_week, dep_hhmm
+    ),
+    scored AS (
+      SELECT
+        s.operator,
+        s.origin,
+        s.destination,
+        s.day_of_week,
+        s.dep_hhmm,
+        s.ws,
+        CASE
+          WHEN s.ws > 0
+          THEN (s.wd + GREATEST((:prior_strength)::float8, 0) * o.prior_d)
+               / (s.ws + GREATEST((:prior_strength)::float8, 0))
+          ELSE o.prior_d
+        END AS disruption_prob,
+        CASE
+          WHEN s.ws > 0
+          THEN (s.wc + GREATEST((:prior_strength)::float8, 0) * o.prior_c)
+               / (s.ws + GREATEST((:prior_strength)::float8, 0))
+          ELSE o.prior_c
+        END AS cancellation_prob
+      FROM slot s
+      JOIN op_prior o USING (operator)
+    ),
+    upserted AS (
+      INSERT INTO slot_metrics (
+        metric_date,
+        model_version,
+        operator,
+        origin,
+        destination,
+        day_of_week,
+        dep_hhmm,
+        disruption_prob,
+        cancellation_prob,
+        reliability_score,
+        effective_sample_size,
+        confidence_band
+      )
+      SELECT
+        (:metric_date)::date,
+        :model_version,
+        operator,
+        origin,
+        destination,
+        day_of_week,
+        dep_hhmm,
+        disruption_prob,
+        cancellation_prob,
+        LEAST(100, GREATEST(0, round(100.0 * (1.0 - disruption_prob))))::int,
+        ws,
+        CASE
+          WHEN ws >= 20.0 THEN 'high'
+          WHEN ws >= 8.0 THEN 'medium'
+          ELSE 'low'
+        END
+      FROM scored
+      ON CONFLICT (metric_date, model_version, operator, origin, destination, day_of_week, dep_hhmm)
+      DO UPDATE SET
+        disruption_prob = EXCLUDED.disruption_prob,
+        cancellation_prob = EXCLUDED.cancellation_prob,
+        reliability_score = EXCLUDED.reliability_score,
+        effective_sample_size = EXCLUDED.effective_sample_size,
+        confidence_band = EXCLUDED.confidence_band
+      RETURNING operator
     )
-    VALUES (
-      :metric_date,
-      :model_version,
-      :operator,
-      :origin,
-      :destination,
-      :day_of_week,
-      :dep_hhmm,
-      :disruption_prob,
-      :cancellation_prob,
-      :reliability_score,
-      :effective_sample_size,
-      :confidence_band
-    )
-    ON CONFLICT (metric_date, model_version, operator, origin, destination, day_of_week, dep_hhmm)
-    DO UPDATE SET
-      disruption_prob = EXCLUDED.disruption_prob,
-      cancellation_prob = EXCLUDED.cancellation_prob,
-      reliability_score = EXCLUDED.reliability_score,
-      effective_sample_size = EXCLUDED.effective_sample_size,
-      confidence_band = EXCLUDED.confidence_band
+    SELECT
+      COUNT(*)                 AS slots_written,
+      COUNT(DISTINCT operator) AS operators_seen
+    FROM upserted
     ;
     """
 )
 
 
-def _start_job(db: Session, job_name: str, meta: dict) -> uuid.UUID:
-    run_id = uuid.uuid4()
-    jr = JobRun(run_id=run_id, job_name=job_name, status="running", meta=meta)
-    db.add(jr)
-    db.commit()
-    return run_id
-
-
-def _finish_job(db: Session, run_id: uuid.UUID, status: str, meta_updates: dict):
-    jr = db.get(JobRun, run_id)
-    jr.status = status
-    jr.ended_at = datetime.utcnow()
-    jr.meta = {**(jr.meta or {}), **meta_updates}
-    db.commit()
-
-
 def compute_slot_metrics(
     db: Session,
     *,
@@ -126,11 +175,14 @@ def compute_slot_metrics(
     Compute and upsert slot_metrics for a rolling window ending at metric_date-1.
 
     Window: [metric_date - window_days, metric_date - 1]
+
+    The whole computation runs server-side as one INSERT ... SELECT; Python only
+    does the job_runs bookkeeping.
     """
     from_date = metric_date - timedelta(days=window_days)
     to_date = metric_date - timedelta(days=1)
 
-    run_id = _start_job(
+    run_id = start_job(
         db,
         "compute_slot_metrics",
         {
@@ -144,99 +196,20 @@ def compute_slot_metrics(
     )
 
     try:
-        # 1) Load daily rows
-        rows = db.execute(
-            _SELECT_DAILY_ROWS,
+        counts = db.execute(
+            _COMPUTE_SLOT_METRICS_SQL,
             {
+                "metric_date": metric_date.isoformat(),
+                "model_version": model_version,
                 "from_date": from_date.isoformat(),
                 "to_date": to_date.isoformat(),
+                "half_life_days": half_life_days,
+                "prior_strength": prior_strength,
                 "operator": operator,
                 "origin": origin,
                 "destination": destination,
             },
-        ).mappings().all()
-
-        if not rows:
-            result = ComputeSlotMetricsResult(
-                metric_date=metric_date.isoformat(),
-                model_version=model_version,
-                window_days=window_days,
-                half_life_days=half_life_days,
-                prior_strength=prior_strength,
-                slots_written=0,
-                operators_seen=0,
-            )
-            _finish_job(db, run_id, "success", {"result": result.__dict__, "note": "no rows in window"})
-            return result
-
-        # 2) Build operator priors using weighted baseline across window
-        # operator_prior = weighted disrupted/services across *all* slots for that operator
-        # We'll compute this by grouping rows by operator and accumulating weighted counts.
-        operator_to_rows: dict[str, list[dict]] = {}
-        for r in rows:
-            operator_to_rows.setdefault(r["operator"], []).append(r)
-
-        operator_prior_disruption: dict[str, float] = {}
-        operator_prior_cancel: dict[str, float] = {}
-
-        for op, op_rows in operator_to_rows.items():
-            w_counts = accumulate_weighted_counts(
-                metric_date=metric_date,
-                rows=op_rows,
-                half_life_days=half_life_days,
-            )
-            # baseline (unsmoothed) operator rate:
-            if w_counts.w_services > 0:
-                operator_prior_disruption[op] = float(w_counts.w_disrupted / w_counts.w_services)
-                operator_prior_cancel[op] = float(w_counts.w_cancelled / w_counts.w_services)
-            else:
-                operator_prior_disruption[op] = 0.0
-                operator_prior_cancel[op] = 0.0
-
-        # 3) Group rows by slot key and compute metrics
-        # Slot key: (operator, origin, destination, day_of_week, dep_hhmm)
-        slot_to_rows: dict[tuple, list[dict]] = {}
-        for r in rows:
-            key = (r["operator"], r["origin"], r["destination"], r["day_of_week"], r["dep_hhmm"])
-            slot_to_rows.setdefault(key, []).append(r)
-
-        slots_written = 0
-
-        for (op, org, dst, dow, hhmm), slot_rows in slot_to_rows.items():
-            w_counts = accumulate_weighted_counts(
-                metric_date=metric_date,
-                rows=slot_rows,
-                half_life_days=half_life_days,
-            )
-
-            computed = compute_slot_metric(
-                w_counts=w_counts,
-                operator_prior_disruption=operator_prior_disruption.get(op, 0.0),
-                operator_prior_cancel=operator_prior_cancel.get(op, 0.0),
-                prior_strength=prior_strength,
-            )
-
-            db.execute(
-                _UPSERT_SLOT_METRICS,
-                {
-                    "metric_date": metric_date.isoformat(),
-                    "model_version": model_version,
-                    "operator": op,
-                    "origin": org,
-                    "destination": dst,
-                    "day_of_week": int(dow),
-                    "dep_hhmm": hhmm,
-                    "disruption_prob": float(computed.disruption_prob),
-                    "cancellation_prob": float(computed.cancellation_prob),
-                    "reliability_score": int(computed.reliability_score),
-                    "effective_sample_size": float(computed.effective_sample_size),
-                    "confidence_band": computed.confidence_band,
-                },
-            )
-            slots_written += 1
-
-            if commit and slots_written % 500 == 0:
-                db.commit()
+        ).mappings().one()
 
         if commit:
             db.commit()
@@ -247,13 +220,16 @@ def compute_slot_metrics(
             window_days=window_days,
             half_life_days=half_life_days,
             prior_strength=prior_strength,
-            slots_written=slots_written,
-            operators_seen=len(operator_to_rows),
+            slots_written=int(counts["slots_written"]),
+            operators_seen=int(counts["operators_seen"]),
         )
-        _finish_job(db, run_id, "success", {"result": result.__dict__})
+        meta_updates = {"result": result.__dict__}
+        if result.slots_written == 0:
+            meta_updates["note"] = "no rows in window"
+        finish_job(db, run_id, "success", meta_updates)
         return result
 
     except Exception as e:
         db.rollback()
-        _finish_job(db, run_id, "fail", {"error": repr(e)})
+        finish_job(db, run_id, "fail", {"error": repr(e)})
         raise
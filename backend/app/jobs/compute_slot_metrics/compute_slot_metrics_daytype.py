@@ -2,28 +2,23 @@ from __future__ import annotations
 
 import uuid
 from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from typing import Optional
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from app.models.job_runs import JobRun
-from app.scoring.v1.slot_metrics import (
-    accumulate_weighted_counts,
-    compute_slot_metric,
-)
+from app.core.result_cache import SLOT_METRICS_REFRESHED_CHANNEL
+from app.jobs.job_runs import finish_job, start_job
 
 DAY_TYPES = ("WEEKDAY", "SATURDAY", "SUNDAY")
 
+# Indexed by Postgres EXTRACT(DOW): 0=Sunday ... 6=Saturday
+_DAY_TYPE_BY_DOW = ("SUNDAY", "WEEKDAY", "WEEKDAY", "WEEKDAY", "WEEKDAY", "WEEKDAY", "SATURDAY")
+
 
 def dow_to_day_type(dow: int) -> str:
-    # Postgres EXTRACT(DOW): 0=Sunday ... 6=Saturday
-    if 1 <= dow <= 5:
-        return "WEEKDAY"
-    if dow == 6:
-        return "SATURDAY"
-    return "SUNDAY"
+    return _DAY_TYPE_BY_DOW[dow]
 
 
 @dataclass(frozen=True)
@@ -37,83 +32,160 @@ class ComputeSlotMetricsDayTypeResult:
     operators_seen: int
 
 
-_SELECT_DAILY_ROWS = text(
-    """
-    SELECT
-      service_date,
-      operator,
-      origin,
-      destination,
-      dep_hhmm,
-      day_of_week,
-      n_services,
-      n_cancelled,
-      n_disrupted
-    FROM daily_slot_agg
-    WHERE service_date >= :from_date
-      AND service_date <= :to_date
-      AND ((:operator)::text IS NULL OR operator = (:operator)::text)
-      AND ((:origin)::text IS NULL OR origin = (:origin)::text)
-      AND ((:destination)::text IS NULL OR destination = (:destination)::text)
-    ORDER BY service_date ASC
-    """
-)
-
-_UPSERT_METRICS = text(
+# --- SQL ---
+# Same model as compute_slot_metrics (and app.scoring.v1.slot_metrics), with slots
+# keyed by day_type instead of day_of_week; day_type follows dow_to_day_type.
+_COMPUTE_SLOT_METRICS_DAYTYPE_SQL = text(
     """
-    INSERT INTO slot_metrics_daytype (
-      metric_date,
-      model_version,
-      operator,
-      origin,
-      destination,
-      day_type,
-      dep_hhmm,
-      disruption_prob,
-      cancellation_prob,
-      reliability_score,
-      effective_sample_size,
-      confidence_band
-    )
-    VALUES (
-      :metric_date,
-      :model_version,
-      :operator,
-      :origin,
-      :destination,
-      :day_type,
-      :dep_hhmm,
-      :disruption_prob,
-      :cancellation_prob,
-      :reliability_score,
-      :effective_sample_size,
-      :confidence_band
+    WITH day_weight AS (
+      -- recency weight depends only on the day's age: one exp() per day in the window,
+      -- not one per daily_slot_agg row
+      SELECT
+        d::date AS service_date,
+        CASE
+          WHEN (:half_life_days)::float8 > 0
+          THEN exp(
+            -ln(2.0::float8)
+            * GREATEST((:metric_date)::date - d::date, 0)
+            / (:half_life_days)::float8
+          )
+          ELSE 1.0::float8
+        END AS w
+      FROM generate_series((:from_date)::date, (:to_date)::date, INTERVAL '1 day') AS d
+    ),
+    weighted AS (
+      SELECT
+        operator,
+        origin,
+        destination,
+        CASE day_of_week WHEN 0 THEN 'SUNDAY' WHEN 6 THEN 'SATURDAY' ELSE 'WEEKDAY' END AS day_type,
+        dep_hhmm,
+        n_services,
+        n_cancelled,
+        n_disrupted,
+        dw.w
+      FROM daily_slot_agg
+      JOIN day_weight dw USING (service_date)
+      WHERE service_date >= :from_date
+        AND service_date <= :to_date
+        AND ((:operator)::text IS NULL OR operator = (:operator)::text)
+        AND ((:origin)::text IS NULL OR origin = (:origin)::text)
+        AND ((:destination)::text IS NULL OR destination = (:destination)::text)
+    ),
+    op_prior AS (
+      -- operator baseline (unsmoothed) across all day_types/dep_hhmm for that operator
+      SELECT
+        operator,
+        COALESCE(SUM(w * n_disrupted) / NULLIF(SUM(w * n_services), 0), 0.0) AS prior_d,
+        COALESCE(SUM(w * n_cancelled) / NULLIF(SUM(w * n_services), 0), 0.0) AS prior_c
+      FROM weighted
+      GROUP BY operator
+    ),
+    slot AS (
+      SELECT
+        operator,
+        origin,
+        destination,
+        day_type,
+        dep_hhmm,
+        SUM(w * n_services)  AS ws,
+        SUM(w * n_disrupted) AS wd,
+        SUM(w * n_cancelled) AS wc
+      FROM weighted
+      GROUP BY operator, origin, destination, day_type, dep_hhmm
+    ),
+    scored AS (
+      SELECT
+        s.operator,
+        s.origin,
+        s.destination,
+        s.day_type,
+        s.dep_hhmm,
+        s.ws,
+        CASE
+          WHEN s.ws > 0
+          THEN (s.wd + GREATEST((:prior_strength)::float8, 0) * o.prior_d)
+               / (s.ws + GREATEST((:prior_strength)::float8, 0))
+          ELSE o.prior_d
+        END AS disruption_prob,
+        CASE
+          WHEN s.ws > 0
+          THEN (s.wc + GREATEST((:prior_strength)::float8, 0) * o.prior_c)
+               / (s.ws + GREATEST((:prior_strength)::float8, 0))
+          ELSE o.prior_c
+        END AS cancellation_prob
+      FROM slot s
+      JOIN op_prior o USING (operator)
+    ),
+    upserted AS (
+      INSERT INTO slot_metrics_daytype (
+        metric_date,
+        model_version,
+        operator,
+        origin,
+        destination,
+        day_type,
+        dep_hhmm,
+        disruption_prob,
+        cancellation_prob,
+        reliability_score,
+        effective_sample_size,
+        confidence_band
+      )
+      SELECT
+        (:metric_date)::date,
+        :model_version,
+        operator,
+        origin,
+        destination,
+        day_type,
+        dep_hhmm,
+        disruption_prob,
+        cancellation_prob,
+        LEAST(100, GREATEST(0, round(100.0 * (1.0 - disruption_prob))))::int,
+        ws,
+        CASE
+          WHEN ws >= 20.0 THEN 'high'
+          WHEN ws >= 8.0 THEN 'medium'
+          ELSE 'low'
+        END
+      FROM scored
+      ON CONFLICT (metric_date, model_version, operator, origin, destination, day_type, dep_hhmm)
+      DO UPDATE SET
+        disruption_prob = EXCLUDED.disruption_prob,
+        cancellation_prob = EXCLUDED.cancellation_prob,
+        reliability_score = EXCLUDED.reliability_score,
+        effective_sample_size = EXCLUDED.effective_sample_size,
+        confidence_band = EXCLUDED.confidence_band
+      RETURNING operator
     )
-    ON CONFLICT (metric_date, model_version, operator, origin, destination, day_type, dep_hhmm)
-    DO UPDATE SET
-      disruption_prob = EXCLUDED.disruption_prob,
-      cancellation_prob = EXCLUDED.cancellation_prob,
-      reliability_score = EXCLUDED.reliability_score,
-      effective_sample_size = EXCLUDED.effective_sample_size,
-      confidence_band = EXCLUDED.confidence_band
+    SELECT
+      COUNT(*)                 AS slots_written,
+      COUNT(DISTINCT operator) AS operators_seen
+    FROM upserted
     ;
     """
 )
 
 
-def _start_job(db: Session, meta: dict) -> uuid.UUID:
-    run_id = uuid.uuid4()
-    jr = JobRun(run_id=run_id, job_name="compute_slot_metrics_daytype", status="running", meta=meta)
-    db.add(jr)
-    db.commit()
-    return run_id
+# /v1/reliability reads these; CONCURRENTLY keeps them readable during the refresh.
+# reliability_slot_view is built from dsa_90d_freq, so refresh that first.
+_REFRESH_DSA_FREQ_VIEW = text("REFRESH MATERIALIZED VIEW CONCURRENTLY dsa_90d_freq")
+_REFRESH_RELIABILITY_VIEW = text("REFRESH MATERIALIZED VIEW CONCURRENTLY reliability_slot_view")
+
+# Tells API processes to drop cached metric_date/baselines; delivered on commit
+_NOTIFY_REFRESHED = text("SELECT pg_notify(:channel, :metric_date)")
 
 
-def _finish_job(db: Session, run_id: uuid.UUID, status: str, meta_updates: dict) -> None:
-    jr = db.get(JobRun, run_id)
-    jr.status = status
-    jr.ended_at = datetime.utcnow()
-    jr.meta = {**(jr.meta or {}), **meta_updates}
+def _finish_job(db: Session, run_id: uuid.UUID, status: str, meta_updates: dict, metric_date: str) -> None:
+    finish_job(db, run_id, status, meta_updates, commit=False)
+    if status == "success":
+        db.execute(_REFRESH_DSA_FREQ_VIEW)
+        db.execute(_REFRESH_RELIABILITY_VIEW)
+        db.execute(
+            _NOTIFY_REFRESHED,
+            {"channel": SLOT_METRICS_REFRESHED_CHANNEL, "metric_date": metric_date},
+        )
     db.commit()
 
 
@@ -135,12 +207,16 @@ def compute_slot_metrics_daytype(
     rather than day_of_week.
 
     Window: [metric_date - window_days, metric_date - 1]
+
+    The whole computation runs server-side as one INSERT ... SELECT; Python only
+    does the job_runs bookkeeping and the view refresh/NOTIFY.
     """
     from_date = metric_date - timedelta(days=window_days)
     to_date = metric_date - timedelta(days=1)
 
-    run_id = _start_job(
+    run_id = start_job(
         db,
+        "compute_slot_metrics_daytype",
         {
             "metric_date": metric_date.isoformat(),
             "model_version": model_version,
@@ -152,101 +228,20 @@ def compute_slot_metrics_daytype(
     )
 
     try:
-        rows = db.execute(
-            _SELECT_DAILY_ROWS,
+        counts = db.execute(
+            _COMPUTE_SLOT_METRICS_DAYTYPE_SQL,
             {
+                "metric_date": metric_date.isoformat(),
+                "model_version": model_version,
                 "from_date": from_date.isoformat(),
                 "to_date": to_date.isoformat(),
+                "half_life_days": half_life_days,
+                "prior_strength": prior_strength,
                 "operator": operator,
                 "origin": origin,
                 "destination": destination,
             },
-        ).mappings().all()
-
-        if not rows:
-            result = ComputeSlotMetricsDayTypeResult(
-                metric_date=metric_date.isoformat(),
-                model_version=model_version,
-                window_days=window_days,
-                half_life_days=half_life_days,
-                prior_strength=prior_strength,
-                slots_written=0,
-                operators_seen=0,
-            )
-            _finish_job(db, run_id, "success", {"result": result.__dict__, "note": "no rows in window"})
-            return result
-
-        # Add derived day_type to each row (still dict-like)
-        enriched = []
-        for r in rows:
-            r = dict(r)
-            r["day_type"] = dow_to_day_type(int(r["day_of_week"]))
-            enriched.append(r)
-
-        # Operator priors: weighted baseline across all day_types/dep_hhmm for that operator
-        operator_to_rows: dict[str, list[dict]] = {}
-        for r in enriched:
-            operator_to_rows.setdefault(r["operator"], []).append(r)
-
-        operator_prior_disruption: dict[str, float] = {}
-        operator_prior_cancel: dict[str, float] = {}
-
-        for op, op_rows in operator_to_rows.items():
-            w_counts = accumulate_weighted_counts(
-                metric_date=metric_date,
-                rows=op_rows,
-                half_life_days=half_life_days,
-            )
-            if w_counts.w_services > 0:
-                operator_prior_disruption[op] = float(w_counts.w_disrupted / w_counts.w_services)
-                operator_prior_cancel[op] = float(w_counts.w_cancelled / w_counts.w_services)
-            else:
-                operator_prior_disruption[op] = 0.0
-                operator_prior_cancel[op] = 0.0
-
-        # Group by DAY_TYPE instead of DOW
-        # Key: (operator, origin, destination, day_type, dep_hhmm)
-        slot_to_rows: dict[tuple, list[dict]] = {}
-        for r in enriched:
-            key = (r["operator"], r["origin"], r["destination"], r["day_type"], r["dep_hhmm"])
-            slot_to_rows.setdefault(key, []).append(r)
-
-        slots_written = 0
-        for (op, org, dst, day_type, hhmm), slot_rows in slot_to_rows.items():
-            w_counts = accumulate_weighted_counts(
-                metric_date=metric_date,
-                rows=slot_rows,
-                half_life_days=half_life_days,
-            )
-
-            computed = compute_slot_metric(
-                w_counts=w_counts,
-                operator_prior_disruption=operator_prior_disruption.get(op, 0.0),
-                operator_prior_cancel=operator_prior_cancel.get(op, 0.0),
-                prior_strength=prior_strength,
-            )
-
-            db.execute(
-                _UPSERT_METRICS,
-                {
-                    "metric_date": metric_date.isoformat(),
-                    "model_version": model_version,
-                    "operator": op,
-                    "origin": org,
-                    "destination": dst,
-                    "day_type": day_type,
-                    "dep_hhmm": hhmm,
-                    "disruption_prob": float(computed.disruption_prob),
-                    "cancellation_prob": float(computed.cancellation_prob),
-                    "reliability_score": int(computed.reliability_score),
-                    "effective_sample_size": float(computed.effective_sample_size),
-                    "confidence_band": computed.confidence_band,
-                },
-            )
-            slots_written += 1
-
-            if commit and slots_written % 500 == 0:
-                db.commit()
+        ).mappings().one()
 
         if commit:
             db.commit()
@@ -257,13 +252,16 @@ def compute_slot_metrics_daytype(
             window_days=window_days,
             half_life_days=half_life_days,
             prior_strength=prior_strength,
-            slots_written=slots_written,
-            operators_seen=len(operator_to_rows),
+            slots_written=int(counts["slots_written"]),
+            operators_seen=int(counts["operators_seen"]),
         )
-        _finish_job(db, run_id, "success", {"result": result.__dict__})
+        meta_updates = {"result": result.__dict__}
+        if result.slots_written == 0:
+            meta_updates["note"] = "no rows in window"
+        _finish_job(db, run_id, "success", meta_updates, metric_date.isoformat())
         return result
 
     except Exception as e:
         db.rollback()
-        _finish_job(db, run_id, "fail", {"error": repr(e)})
-        raise
\ No newline at end of file
+        _finish_job(db, run_id, "fail", {"error": repr(e)}, metric_date.isoformat())
+        raise
@@ -1,54 +1,67 @@
 import uuid
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 
 from app.models.raw_service_events import RawServiceEvent
 from app.jobs.ingest.types import CanonicalServiceEvent
 
+# raw_service_events is partitioned by month; partitions are created on demand
+_ENSURE_PARTITIONS = text("SELECT rse_ensure_partitions((:from_date)::date, (:to_date)::date)")
+
+# Rows per multi-VALUES INSERT: 13 binds/row (the 12 payload columns plus the Python-side
+# id default) stays well under the 65535 limit
+_INSERT_BATCH_SIZE = 1000
+
+
 def load_events(db: Session, events: list[CanonicalServiceEvent], source_run_id: uuid.UUID) -> dict:
     """
     Insert canonical events into raw_service_events idempotently.
-    Requires a UNIQUE constraint on:
-      (service_date, operator, origin, destination, scheduled_departure_ts)
+    Requires a UNIQUE constraint on (service_key, service_date).
     """
-    inserted = 0
-    skipped = 0
+    if not events:
+        return {"total": 0, "inserted": 0, "skipped": 0}
+
+    payloads = [
+        {
+            "service_date": ev.service_date,
+            "operator": ev.operator,
+            "origin": ev.origin,
+            "destination": ev.destination,
+            "scheduled_departure_ts": ev.scheduled_departure_ts,
+            "scheduled_arrival_ts": ev.scheduled_arrival_ts,
+            "actual_arrival_ts": ev.actual_arrival_ts,
+            "cancelled": ev.cancelled,
+            "arrival_delay_minutes": ev.arrival_delay_minutes,
+            "service_key": ev.service_key,
+            "source_run_id": source_run_id,
+            "sourced": ev.source,
+        }
+        for ev in events
+    ]
 
-    for i, ev in enumerate(events, start=1):
+    dates = [ev.service_date for ev in events]
+    db.execute(_ENSURE_PARTITIONS, {"from_date": min(dates), "to_date": max(dates)})
+
+    inserted = 0
+    for i in range(0, len(payloads), _INSERT_BATCH_SIZE):
         stmt = (
             insert(RawServiceEvent)
-            .values(
-                service_date=ev.service_date,
-                operator=ev.operator,
-                origin=ev.origin,
-                destination=ev.destination,
-                scheduled_departure_ts=ev.scheduled_departure_ts,
-                scheduled_arrival_ts=ev.scheduled_arrival_ts,
-                actual_arrival_ts=ev.actual_arrival_ts,
-                cancelled=ev.cancelled,
-                arrival_delay_minutes=ev.arrival_delay_minutes,
-                service_key=ev.service_key,
-                source_run_id=source_run_id,
-                sourced=ev.source
-            )
+            .values(payloads[i : i + _INSERT_BATCH_SIZE])
             .on_conflict_do_nothing(
                 index_elements=[
-                    "service_key"
+                    "service_key",
+                    "service_date",
                 ]
             )
             .returning(RawServiceEvent.id)
         )
 
+        # RETURNING only yields rows that were actually inserted; conflicts are skipped
         res = db.execute(stmt)
-        row = res.fetchone()
-        if row == 1:
-            inserted += 1
-        else:
-            skipped += 1
-
-        # batch commits to keep memory small and speed stable
-        if i % 1000 == 0:
-            db.commit()
-
-    db.commit()
-    return {"total": len(events), "inserted": inserted, "skipped": skipped}
+        inserted += len(res.fetchall())
+
+        # commit per batch to keep memory small and speed stable
+        db.commit()
+
+    return {"total": len(events), "inserted": inserted, "skipped": len(events) - inserted}
@@ -1,41 +1,33 @@
 import argparse
-import uuid
-from datetime import datetime
+from dataclasses import asdict, dataclass
+from typing import Optional
+
 from sqlalchemy.orm import Session
 
 from app.core.db import SessionLocal
-from app.models.job_runs import JobRun
+from app.jobs.job_runs import finish_job, start_job
 from app.jobs.ingest.registry import SOURCES
 
-def main():
-    p = argparse.ArgumentParser(description="Ingest rail performance data into raw_service_events")
-    p.add_argument("--source", required=True, choices=SOURCES.keys())
 
-    p.add_argument("--from-loc", required=True, help="CRS code (e.g. RDG)")
-    p.add_argument("--to-loc", required=True, help="CRS code (e.g. PAD)")
+@dataclass(frozen=True)
+class IngestArgs:
+    source: str
+    from_loc: str
+    to_loc: str
+    from_date: str
+    to_date: str
+    from_time: str
+    to_time: str
+    days: str
+    toc: Optional[list[str]] = None
 
-    p.add_argument("--from-date", required=True, help="YYYY-MM-DD")
-    p.add_argument("--to-date", required=True, help="YYYY-MM-DD")
 
-    p.add_argument("--from-time", required=True, help="HHMM (e.g. 0630)")
-    p.add_argument("--to-time", required=True, help="HHMM (e.g. 0930)")
-
-    p.add_argument("--days", required=True, choices=["WEEKDAY", "SATURDAY", "SUNDAY"])
-    p.add_argument("--toc", action="append", help="Optional TOC code filter; repeatable (e.g. --toc GW)")
-
-    args = p.parse_args()
-
-    db: Session = SessionLocal()
-    run_id = uuid.uuid4()
-
-    job = JobRun(
-        run_id=run_id,
-        job_name=f"ingest_{args.source}",
-        status="running",
-        meta={"args": vars(args)},
-    )
-    db.add(job)
-    db.commit()
+def run_ingest(args: IngestArgs, db: Session) -> dict:
+    """
+    Run one ingest (fetch -> normalize -> load) with job_runs bookkeeping.
+    Callable in-process (e.g. from the backfill driver) as well as from the CLI.
+    """
+    run_id = start_job(db, f"ingest_{args.source}", {"args": asdict(args)})
 
     try:
         source = SOURCES[args.source]()  # instantiate adapter
@@ -52,23 +44,38 @@ def main():
             toc_filter=args.toc,
         )
 
-        job = db.get(JobRun, run_id)
-        job.status = "success"
-        job.ended_at = datetime.utcnow()
-        job.meta = {**(job.meta or {}), **result}
-        db.commit()
+        finish_job(db, run_id, "success", result)
 
-        print(result)
+        return result
 
     except Exception as e:
         db.rollback()
-        job = db.get(JobRun, run_id)
-        job.status = "fail"
-        job.ended_at = datetime.utcnow()
-        job.meta = {**(job.meta or {}), "error": repr(e)}
-        db.commit()
+        finish_job(db, run_id, "fail", {"error": repr(e)})
         raise
 
+
+def main():
+    p = argparse.ArgumentParser(description="Ingest rail performance data into raw_service_events")
+    p.add_argument("--source", required=True, choices=SOURCES.keys())
+
+    p.add_argument("--from-loc", required=True, help="CRS code (e.g. RDG)")
+    p.add_argument("--to-loc", required=True, help="CRS code (e.g. PAD)")
+
+    p.add_argument("--from-date", required=True, help="YYYY-MM-DD")
+    p.add_argument("--to-date", required=True, help="YYYY-MM-DD")
+
+    p.add_argument("--from-time", required=True, help="HHMM (e.g. 0630)")
+    p.add_argument("--to-time", required=True, help="HHMM (e.g. 0930)")
+
+    p.add_argument("--days", required=True, choices=["WEEKDAY", "SATURDAY", "SUNDAY"])
+    p.add_argument("--toc", action="append", help="Optional TOC code filter; repeatable (e.g. --toc GW)")
+
+    args = p.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        result = run_ingest(IngestArgs(**vars(args)), db)
+        print(result)
     finally:
         db.close()
 
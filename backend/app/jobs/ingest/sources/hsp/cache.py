@@ -0,0 +1,55 @@
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    HSP responses stored on disk as gzip'd JSON, one file per sha1(path, payload).
+    Safe to share between backfill worker processes: writes are atomic renames.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(path: str, payload: dict) -> str:
+        # compact, sorted output: same bytes (and keys) as the old json.dumps for these ASCII payloads
+        raw = orjson.dumps({"path": path, "payload": payload}, option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha1(raw).hexdigest()
+
+    def _file(self, key: str) -> str:
+        # two-level fan-out keeps directories small on long backfills
+        return os.path.join(self.root, key[:2], f"{key}.json.gz")
+
+    def get(self, path: str, payload: dict) -> Optional[dict]:
+        fn = self._file(self.key(path, payload))
+        try:
+            with open(fn, "rb") as f:
+                return orjson.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable cache entry %s: %r", fn, e)
+            return None
+
+    def set(self, path: str, payload: dict, body: dict) -> None:
+        fn = self._file(self.key(path, payload))
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        blob = gzip.compress(orjson.dumps(body))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fn), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, fn)
+        except BaseException:
+            os.unlink(tmp)
+            raise
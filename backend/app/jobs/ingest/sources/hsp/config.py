@@ -14,16 +14,34 @@ class HspConfig:
     metrics_read_timeout: float
     details_read_timeout: float
 
+    # httpx connection pool, shared by the metrics/details worker threads
+    pool_max: int
+    pool_keepalive: int
+    pool_keepalive_expiry: float
+
     metrics_window_minutes: int
     metrics_filter_weekdays: bool
 
-    delay: float
+    # client-side token bucket shared by all request threads; rate <= 0 disables it
+    rate_per_second: float
+    rate_burst: int
     max_details: int
+    metrics_concurrency: int
+    details_concurrency: int
+    load_batch_size: int
 
     retries: int
     backoff_base: float
+    # consecutive failed attempts that open the shared circuit breaker (0 disables it)
+    breaker_failures: int
+    breaker_reset_seconds: float
     progress_every: int
 
+    # serviceMetrics response cache; empty cache_dir disables it.
+    # Dates newer than cache_min_age_days may still change upstream and are never cached.
+    cache_dir: str
+    cache_min_age_days: int
+
 
 def load_config() -> HspConfig:
     username = os.getenv("HSP_USERNAME")
@@ -40,11 +58,22 @@ def load_config() -> HspConfig:
         pool_timeout=float(os.getenv("HSP_POOL_TIMEOUT_SECONDS", "30")),
         metrics_read_timeout=float(os.getenv("HSP_METRICS_READ_TIMEOUT_SECONDS", "240")),
         details_read_timeout=float(os.getenv("HSP_DETAILS_READ_TIMEOUT_SECONDS", "60")),
+        pool_max=int(os.getenv("HSP_POOL_MAX", "200")),
+        pool_keepalive=int(os.getenv("HSP_POOL_KEEPALIVE", "50")),
+        pool_keepalive_expiry=float(os.getenv("HSP_POOL_KEEPALIVE_EXPIRY_SECONDS", "30")),
         metrics_window_minutes=int(os.getenv("HSP_METRICS_WINDOW_MINUTES", "60")),
         metrics_filter_weekdays=os.getenv("HSP_METRICS_FILTER_WEEKDAYS", "1") == "1",
-        delay=float(os.getenv("HSP_REQUEST_DELAY_SECONDS", "0.15")),
+        rate_per_second=float(os.getenv("HSP_RATE_PER_SECOND", "10")),
+        rate_burst=int(os.getenv("HSP_RATE_BURST", "10")),
         max_details=int(os.getenv("HSP_MAX_DETAILS", "0")),
+        metrics_concurrency=int(os.getenv("HSP_METRICS_CONCURRENCY", "8")),
+        details_concurrency=int(os.getenv("HSP_DETAILS_CONCURRENCY", "12")),
+        load_batch_size=max(1, int(os.getenv("HSP_LOAD_BATCH_SIZE", "500"))),
         retries=int(os.getenv("HSP_RETRIES", "6")),
         backoff_base=float(os.getenv("HSP_BACKOFF_BASE_SECONDS", "1.5")),
+        breaker_failures=int(os.getenv("HSP_BREAKER_FAILURES", "20")),
+        breaker_reset_seconds=float(os.getenv("HSP_BREAKER_RESET_SECONDS", "30")),
         progress_every=int(os.getenv("HSP_PROGRESS_EVERY", "50")),
+        cache_dir=os.getenv("HSP_CACHE_DIR", ".cache/hsp"),
+        cache_min_age_days=int(os.getenv("HSP_CACHE_MIN_AGE_DAYS", "2")),
     )
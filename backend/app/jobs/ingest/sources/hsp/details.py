@@ -9,6 +9,11 @@ from app.jobs.ingest.utils.time import hhmm_to_dt, roll_if_next_day
 logger = logging.getLogger(__name__)
 
 
+def clean_str(v) -> str:
+    # stripped string, or "" for missing/None/non-string values (both HSP sources use this)
+    return v.strip() if isinstance(v, str) else ""
+
+
 def details_to_event(
     *,
     rid: str,
@@ -19,25 +24,33 @@ def details_to_event(
 ) -> Optional[CanonicalServiceEvent]:
     data = details_json.get("serviceAttributesDetails", {}) or {}
 
-    dos = (data.get("date_of_service") or "").strip()
+    dos = clean_str(data.get("date_of_service"))
     if not dos:
         logger.debug("RID %s skipped: missing date_of_service", rid)
         return None
 
     service_date = Date.fromisoformat(dos)
 
-    toc = (data.get("toc_code") or "").strip() or service_templates.get(rid, ("", "", ""))[2]
+    # (gbtt_ptd, gbtt_pta, toc_code) from serviceMetrics, used as fallbacks
+    tmpl = service_templates.get(rid, ("", "", ""))
+
+    toc = clean_str(data.get("toc_code")) or tmpl[2]
 
-    locs = data.get("locations", []) or []
-    origin_row = next((x for x in locs if x.get("location") == from_loc), None)
-    dest_row = next((x for x in locs if x.get("location") == to_loc), None)
+    # one pass over the calling points; first occurrence wins, as with a linear search
+    locs_by_code: dict[str, dict] = {}
+    for x in data.get("locations", []) or []:
+        code = x.get("location")
+        if code:
+            locs_by_code.setdefault(code, x)
+    origin_row = locs_by_code.get(from_loc)
+    dest_row = locs_by_code.get(to_loc)
 
     if not origin_row or not dest_row:
         logger.debug("RID %s skipped: missing origin/destination rows for %s/%s", rid, from_loc, to_loc)
         return None
 
-    gbtt_ptd = (origin_row.get("gbtt_ptd") or "").strip() or service_templates.get(rid, ("", "", ""))[0]
-    gbtt_pta = (dest_row.get("gbtt_pta") or "").strip() or service_templates.get(rid, ("", "", ""))[1]
+    gbtt_ptd = clean_str(origin_row.get("gbtt_ptd")) or tmpl[0]
+    gbtt_pta = clean_str(dest_row.get("gbtt_pta")) or tmpl[1]
 
     sched_dep = hhmm_to_dt(service_date, gbtt_ptd)
     if sched_dep is None:
@@ -46,7 +59,7 @@ def details_to_event(
 
     sched_arr = roll_if_next_day(sched_dep, hhmm_to_dt(service_date, gbtt_pta))
 
-    actual_ta = (dest_row.get("actual_ta") or "").strip()
+    actual_ta = clean_str(dest_row.get("actual_ta"))
     act_arr = roll_if_next_day(sched_dep, hhmm_to_dt(service_date, actual_ta))
 
     cancelled = (act_arr is None)
@@ -1,9 +1,11 @@
 import logging
 import random
+import threading
 import time
 from typing import Optional
 
 import httpx
+import orjson
 
 from .config import HspConfig
 
@@ -38,6 +40,102 @@ def log_request(request: httpx.Request) -> None:
     logger.debug("HTTP Authorization: %s", mask_basic_auth(request.headers.get("authorization")))
 
 
+class TokenBucket:
+    """
+    Thread-safe client-side rate limiter shared by all workers.
+    Refill rate backs off multiplicatively on 429/503 (shrink) and recovers additively
+    after a run of successes (grow), never exceeding the configured rate.
+    rate_per_sec <= 0 disables limiting.
+    """
+
+    def __init__(self, rate_per_sec: float, burst: int, *, min_rate: float = 0.5, grow_after: int = 20):
+        self.max_rate = rate_per_sec
+        self.rate = rate_per_sec
+        self.min_rate = min(min_rate, rate_per_sec)
+        self.burst = max(1, burst)
+        self.grow_after = grow_after
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.max_rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+    def shrink(self) -> None:
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._successes = 0
+        logger.warning("Upstream throttling; request rate lowered to %.2f/s", self.rate)
+
+    def grow(self) -> None:
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            if self.rate >= self.max_rate:
+                return
+            self._successes += 1
+            if self._successes < self.grow_after:
+                return
+            self._successes = 0
+            self.rate = min(self.max_rate, self.rate + max(1.0, self.max_rate / 10))
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Shared fast-fail switch for an unhealthy upstream. After failure_threshold consecutive
+    failed attempts it opens for reset_timeout seconds, during which requests raise
+    CircuitOpenError immediately instead of each working through its own retry/backoff
+    schedule. Callers must let CircuitOpenError abort the run rather than count it as a
+    per-item failure. Once the timeout passes, a single further failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 20, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        return self.failure_threshold <= 0 or time.monotonic() >= self._open_until
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold and time.monotonic() >= self._open_until:
+                self._open_until = time.monotonic() + self.reset_timeout
+                self._failures = self.failure_threshold - 1
+                logger.error(
+                    "Circuit open after %d consecutive failures; failing fast for %.0fs",
+                    self.failure_threshold,
+                    self.reset_timeout,
+                )
+
+
 def make_client(cfg: HspConfig, *, read_timeout: float) -> httpx.Client:
     auth = httpx.BasicAuth(cfg.username, cfg.password)
     timeout = httpx.Timeout(
@@ -46,12 +144,21 @@ def make_client(cfg: HspConfig, *, read_timeout: float) -> httpx.Client:
         write=cfg.write_timeout,
         pool=cfg.pool_timeout,
     )
+    limits = httpx.Limits(
+        max_connections=cfg.pool_max,
+        max_keepalive_connections=cfg.pool_keepalive,
+        keepalive_expiry=cfg.pool_keepalive_expiry,
+    )
+    # HTTP/2 multiplexes concurrent requests over one TLS connection; retries are
+    # handled by post_with_retry, so the transport's own connect retries stay off.
     return httpx.Client(
         base_url=cfg.base_url,
         auth=auth,
         timeout=timeout,
         headers={"Content-Type": "application/json"},
-        event_hooks={"request": [log_request]},
+        # Only pay for the per-request hook (auth masking, formatting) when it would log
+        event_hooks={"request": [log_request]} if logger.isEnabledFor(logging.DEBUG) else {},
+        transport=httpx.HTTPTransport(http2=True, retries=0, limits=limits),
     )
 
 
@@ -62,13 +169,33 @@ def sleep_backoff(cfg: HspConfig, *, attempt: int, path: str) -> None:
     time.sleep(sleep_s)
 
 
-def post_with_retry(cfg: HspConfig, client: httpx.Client, path: str, payload: dict) -> dict:
+def post_with_retry(
+    cfg: HspConfig,
+    client: httpx.Client,
+    path: str,
+    payload: dict,
+    *,
+    bucket: Optional[TokenBucket] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    read_timeout: Optional[float] = None,
+) -> dict:
     last_err: Exception | None = None
+    # Lets one client serve endpoints with different read timeouts
+    timeout = client.timeout if read_timeout is None else httpx.Timeout(
+        connect=cfg.connect_timeout,
+        read=read_timeout,
+        write=cfg.write_timeout,
+        pool=cfg.pool_timeout,
+    )
 
     for attempt in range(1, cfg.retries + 1):
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"POST {path} not attempted: upstream circuit open") from last_err
+        if bucket is not None:
+            bucket.acquire()
         t0 = time.perf_counter()
         try:
-            r = client.post(path, json=payload)
+            r = client.post(path, content=orjson.dumps(payload), timeout=timeout)
             elapsed = time.perf_counter() - t0
 
             if r.status_code in RETRY_STATUSES:
@@ -82,6 +209,8 @@ def post_with_retry(cfg: HspConfig, client: httpx.Client, path: str, payload: di
                     elapsed,
                     snippet,
                 )
+                if bucket is not None and (r.status_code in (429, 503) or "retry-after" in r.headers):
+                    bucket.shrink()
                 raise httpx.HTTPStatusError("Retryable status", request=r.request, response=r)
 
             if elapsed > 10:
@@ -90,7 +219,11 @@ def post_with_retry(cfg: HspConfig, client: httpx.Client, path: str, payload: di
                 logger.debug("POST %s completed in %.2fs status=%d", path, elapsed, r.status_code)
 
             r.raise_for_status()
-            return r.json()
+            if bucket is not None:
+                bucket.grow()
+            if breaker is not None:
+                breaker.record_success()
+            return orjson.loads(r.content)
 
         except (httpx.ReadTimeout, httpx.ConnectTimeout) as e:
             elapsed = time.perf_counter() - t0
@@ -102,8 +235,8 @@ def post_with_retry(cfg: HspConfig, client: httpx.Client, path: str, payload: di
                 cfg.retries,
                 path,
                 elapsed,
-                float(client.timeout.connect),
-                float(client.timeout.read),
+                float(timeout.connect),
+                float(timeout.read),
             )
 
         except httpx.HTTPStatusError as e:
@@ -133,6 +266,8 @@ def post_with_retry(cfg: HspConfig, client: httpx.Client, path: str, payload: di
                 e,
             )
 
+        if breaker is not None:
+            breaker.record_failure()
         sleep_backoff(cfg, attempt=attempt, path=path)
 
     raise last_err  # type: ignore
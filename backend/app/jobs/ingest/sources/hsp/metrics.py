@@ -1,11 +1,14 @@
 import logging
-from datetime import date as Date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date, timedelta
 from typing import Optional
 
 import httpx
 
+from .cache import ResponseCache
 from .config import HspConfig
-from .http import post_with_retry
+from .details import clean_str
+from .http import CircuitBreaker, TokenBucket, post_with_retry
 
 logger = logging.getLogger(__name__)
 
@@ -30,32 +33,22 @@ def time_windows(from_time: str, to_time: str, step_minutes: int) -> list[tuple[
     sh, sm = parse_hhmm(from_time)
     eh, em = parse_hhmm(to_time)
 
-    start = datetime(2000, 1, 1, sh, sm)
-    end = datetime(2000, 1, 1, eh, em)
+    start = sh * 60 + sm
+    end = eh * 60 + em
 
     windows: list[tuple[str, str]] = []
-    cur = start
-    while cur < end:
-        nxt = min(cur + timedelta(minutes=step_minutes), end)
-        windows.append((fmt_hhmm(cur.hour, cur.minute), fmt_hhmm(nxt.hour, nxt.minute)))
-        cur = nxt
+    for cur in range(start, end, step_minutes):
+        nxt = min(cur + step_minutes, end)
+        windows.append((fmt_hhmm(*divmod(cur, 60)), fmt_hhmm(*divmod(nxt, 60))))
     return windows
 
 
-def date_range(from_date: str, to_date: str) -> list[str]:
+def date_range(from_date: str, to_date: str, only_weekday: bool = False) -> list[str]:
+    """ISO dates in [from_date, to_date]; Mon–Fri only when only_weekday."""
     d0 = Date.fromisoformat(from_date)
-    d1 = Date.fromisoformat(to_date)
-    out: list[str] = []
-    d = d0
-    while d <= d1:
-        out.append(d.isoformat())
-        d += timedelta(days=1)
-    return out
-
-
-def weekday_only(dates: list[str]) -> list[str]:
-    """Filter ISO date strings to Mon–Fri."""
-    return [s for s in dates if Date.fromisoformat(s).weekday() < 5]
+    days = (Date.fromisoformat(to_date) - d0).days + 1
+    dates = (d0 + timedelta(days=i) for i in range(days))
+    return [d.isoformat() for d in dates if not only_weekday or d.weekday() < 5]
 
 
 def fetch_service_metrics_chunked(
@@ -70,15 +63,23 @@ def fetch_service_metrics_chunked(
     to_time: str,
     days: str,
     toc_filter: Optional[list[str]],
+    cache: Optional[ResponseCache] = None,
+    bucket: Optional[TokenBucket] = None,
+    breaker: Optional[CircuitBreaker] = None,
 ) -> list[dict]:
-    """Calls /serviceMetrics in smaller chunks; returns merged list of Services entries."""
+    """
+    Calls /serviceMetrics in smaller chunks; returns merged list of Services entries.
+    With a cache, responses for dates older than cfg.cache_min_age_days are reused across runs.
+    """
     base_payload = {"from_loc": from_loc, "to_loc": to_loc, "days": days}
     if toc_filter:
         base_payload["toc_filter"] = toc_filter
 
-    dates = date_range(from_date, to_date)
-    if cfg.metrics_filter_weekdays and days.upper() == "WEEKDAY":
-        dates = weekday_only(dates)
+    dates = date_range(
+        from_date,
+        to_date,
+        only_weekday=cfg.metrics_filter_weekdays and days.upper() == "WEEKDAY",
+    )
 
     windows = time_windows(from_time, to_time, cfg.metrics_window_minutes)
     total_requests = len(dates) * len(windows)
@@ -91,24 +92,55 @@ def fetch_service_metrics_chunked(
         total_requests,
     )
 
+    cacheable_before = (Date.today() - timedelta(days=cfg.cache_min_age_days)).isoformat()
+    tasks = [(d, w_from, w_to) for d in dates for w_from, w_to in windows]
+
+    def fetch_chunk(req_idx: int, task: tuple[str, str, str]) -> tuple[list[dict], bool]:
+        d, w_from, w_to = task
+        payload = {
+            **base_payload,
+            "from_date": d,
+            "to_date": d,
+            "from_time": w_from,
+            "to_time": w_to,
+        }
+        use_cache = cache is not None and d < cacheable_before
+        mj = cache.get("/serviceMetrics", payload) if use_cache else None
+        if mj is not None:
+            logger.debug("serviceMetrics chunk %d/%d date=%s %s-%s (cached)", req_idx, total_requests, d, w_from, w_to)
+            return mj.get("Services", []) or [], True
+
+        logger.info("serviceMetrics chunk %d/%d date=%s %s-%s", req_idx, total_requests, d, w_from, w_to)
+        mj = post_with_retry(
+            cfg,
+            client,
+            "/serviceMetrics",
+            payload,
+            bucket=bucket,
+            breaker=breaker,
+            read_timeout=cfg.metrics_read_timeout,
+        )
+        if use_cache:
+            cache.set("/serviceMetrics", payload, mj)
+        return mj.get("Services", []) or [], False
+
+    # Purely I/O bound: overlap the round-trips on a few threads sharing the client's pool.
+    # ex.map yields in submission order, so services stay ordered by (date, window).
+    with ThreadPoolExecutor(max_workers=max(1, cfg.metrics_concurrency)) as ex:
+        results = list(ex.map(fetch_chunk, range(1, total_requests + 1), tasks))
+
     merged_services: list[dict] = []
-    req_idx = 0
-
-    for d in dates:
-        for w_from, w_to in windows:
-            req_idx += 1
-            payload = {
-                **base_payload,
-                "from_date": d,
-                "to_date": d,
-                "from_time": w_from,
-                "to_time": w_to,
-            }
-            logger.info("serviceMetrics chunk %d/%d date=%s %s-%s", req_idx, total_requests, d, w_from, w_to)
-            mj = post_with_retry(cfg, client, "/serviceMetrics", payload)
-            merged_services.extend(mj.get("Services", []) or [])
-
-    logger.info("serviceMetrics chunks complete: merged_services=%d", len(merged_services))
+    cache_hits = 0
+    for services, hit in results:
+        merged_services.extend(services)
+        cache_hits += hit
+
+    logger.info(
+        "serviceMetrics chunks complete: merged_services=%d cache_hits=%d/%d",
+        len(merged_services),
+        cache_hits,
+        total_requests,
+    )
     return merged_services
 
 
@@ -120,21 +152,19 @@ def extract_rids_and_templates(
       rids: unique list of rids
       templates: rid -> (gbtt_ptd, gbtt_pta, toc_code)
     """
-    rids: list[str] = []
+    # dict keeps insertion order: keys double as the deduplicated, ordered rid list
     templates: dict[str, tuple[str, str, str]] = {}
 
     for s in services:
         attrs = s.get("serviceAttributesMetrics", {}) or {}
-        gbtt_ptd = (attrs.get("gbtt_ptd") or "").strip()
-        gbtt_pta = (attrs.get("gbtt_pta") or "").strip()
-        toc = (attrs.get("toc_code") or "").strip()
+        tmpl = (
+            clean_str(attrs.get("gbtt_ptd")),
+            clean_str(attrs.get("gbtt_pta")),
+            clean_str(attrs.get("toc_code")),
+        )
 
         for rid in as_list(attrs.get("rids")):
-            if not rid:
-                continue
-            if rid in templates:
-                continue
-            rids.append(rid)
-            templates[rid] = (gbtt_ptd, gbtt_pta, toc)
-
-    return rids, templates
+            if rid and rid not in templates:
+                templates[rid] = tmpl
+
+    return list(templates), templates
@@ -1,6 +1,7 @@
 import logging
-import time
 import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional
 
 from sqlalchemy.orm import Session
@@ -9,9 +10,17 @@ from app.jobs.ingest.loader import load_events
 from app.jobs.ingest.sources.base import BaseSource
 from app.jobs.ingest.types import CanonicalServiceEvent
 
+from .cache import ResponseCache
 from .config import load_config
 from .details import details_to_event
-from .http import configure_logging_if_needed, make_client, post_with_retry
+from .http import (
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucket,
+    configure_logging_if_needed,
+    make_client,
+    post_with_retry,
+)
 from .metrics import extract_rids_and_templates, fetch_service_metrics_chunked
 
 logger = logging.getLogger(__name__)
@@ -27,10 +36,14 @@ class HspSource(BaseSource):
     def __init__(self):
         configure_logging_if_needed()
         self.cfg = load_config()
+        self.metrics_cache = ResponseCache(self.cfg.cache_dir) if self.cfg.cache_dir else None
+        self.bucket = TokenBucket(self.cfg.rate_per_second, self.cfg.rate_burst)
+        self.breaker = CircuitBreaker(self.cfg.breaker_failures, self.cfg.breaker_reset_seconds)
 
         logger.info(
             "HSP configured base_url=%s timeouts(connect=%.1f write=%.1f pool=%.1f read_metrics=%.1f read_details=%.1f) "
-            "metrics_window_minutes=%d filter_weekdays=%s delay=%.2f retries=%d backoff_base=%.2f max_details=%s",
+            "metrics_window_minutes=%d filter_weekdays=%s rate=%.1f/s burst=%d retries=%d backoff_base=%.2f max_details=%s "
+            "details_concurrency=%d",
             self.cfg.base_url,
             self.cfg.connect_timeout,
             self.cfg.write_timeout,
@@ -39,10 +52,12 @@ class HspSource(BaseSource):
             self.cfg.details_read_timeout,
             self.cfg.metrics_window_minutes,
             self.cfg.metrics_filter_weekdays,
-            self.cfg.delay,
+            self.cfg.rate_per_second,
+            self.cfg.rate_burst,
             self.cfg.retries,
             self.cfg.backoff_base,
             "unlimited" if self.cfg.max_details == 0 else str(self.cfg.max_details),
+            self.cfg.details_concurrency,
         )
 
     def ingest(
@@ -73,12 +88,14 @@ class HspSource(BaseSource):
             toc_filter or [],
             )
 
-        # 1) serviceMetrics (chunked)
-        logger.info("Fetching serviceMetrics (chunked) read_timeout=%.1fs ...", self.cfg.metrics_read_timeout)
-        with make_client(self.cfg, read_timeout=self.cfg.metrics_read_timeout) as metrics_client:
+        # One client (and connection pool) for both phases; the client default read timeout
+        # suits serviceDetails and the metrics calls override it per request.
+        with make_client(self.cfg, read_timeout=self.cfg.details_read_timeout) as client:
+            # 1) serviceMetrics (chunked)
+            logger.info("Fetching serviceMetrics (chunked) read_timeout=%.1fs ...", self.cfg.metrics_read_timeout)
             services = fetch_service_metrics_chunked(
                 self.cfg,
-                metrics_client,
+                client,
                 from_loc=from_loc,
                 to_loc=to_loc,
                 from_date=from_date,
@@ -87,46 +104,49 @@ class HspSource(BaseSource):
                 to_time=to_time,
                 days=days,
                 toc_filter=toc_filter,
+                cache=self.metrics_cache,
+                bucket=self.bucket,
+                breaker=self.breaker,
             )
 
-        rids, service_templates = extract_rids_and_templates(services)
-        logger.info("serviceMetrics produced %d unique RIDs (from merged_services=%d)", len(rids), len(services))
-
-        # 2) serviceDetails per RID
-        events: list[CanonicalServiceEvent] = []
-        details_fetched = 0
-        details_failed = 0
-        invalid_skipped = 0
-
-        total = len(rids)
-        logger.info("Fetching serviceDetails for %d RIDs read_timeout=%.1fs ...", total, self.cfg.details_read_timeout)
-
-        with make_client(self.cfg, read_timeout=self.cfg.details_read_timeout) as details_client:
-            for idx, rid in enumerate(rids, start=1):
-                if self.cfg.max_details and idx > self.cfg.max_details:
-                    logger.info(
-                        "Stopping early due to HSP_MAX_DETAILS=%d (processed=%d/%d)",
-                        self.cfg.max_details,
-                        idx - 1,
-                        total,
-                        )
-                    break
-
-                if self.cfg.progress_every and (idx == 1 or idx % self.cfg.progress_every == 0 or idx == total):
-                    logger.info(
-                        "serviceDetails progress %d/%d (fetched=%d failed=%d skipped=%d)",
-                        idx,
-                        total,
-                        details_fetched,
-                        details_failed,
-                        invalid_skipped,
-                    )
-
-                if self.cfg.delay > 0:
-                    time.sleep(self.cfg.delay)
+            rids, service_templates = extract_rids_and_templates(services)
+            logger.info("serviceMetrics produced %d unique RIDs (from merged_services=%d)", len(rids), len(services))
+
+            # 2) serviceDetails per RID
+            # Events are written in load_batch_size chunks as they arrive, so DB inserts
+            # overlap with the remaining fetches instead of waiting for all of them
+            buffer: list[CanonicalServiceEvent] = []
+            counts: Counter[str] = Counter()  # "fetched" / "skipped" / "failed"
+            load_stats: Counter[str] = Counter(total=0, inserted=0, skipped=0)
+
+            to_fetch = rids
+            if self.cfg.max_details and len(rids) > self.cfg.max_details:
+                to_fetch = rids[: self.cfg.max_details]
+                logger.info(
+                    "Stopping early due to HSP_MAX_DETAILS=%d (fetching %d/%d)",
+                    self.cfg.max_details,
+                    len(to_fetch),
+                    len(rids),
+                )
+
+            total = len(to_fetch)
+            logger.info(
+                "Fetching serviceDetails for %d RIDs read_timeout=%.1fs concurrency=%d ...",
+                total,
+                self.cfg.details_read_timeout,
+                self.cfg.details_concurrency,
+            )
 
+            def fetch_one(rid: str) -> tuple[str, Optional[CanonicalServiceEvent]]:
                 try:
-                    details_json = post_with_retry(self.cfg, details_client, "/serviceDetails", {"rid": rid})
+                    details_json = post_with_retry(
+                        self.cfg,
+                        client,
+                        "/serviceDetails",
+                        {"rid": rid},
+                        bucket=self.bucket,
+                        breaker=self.breaker,
+                    )
                     evt = details_to_event(
                         rid=rid,
                         details_json=details_json,
@@ -134,22 +154,45 @@ class HspSource(BaseSource):
                         to_loc=to_loc,
                         service_templates=service_templates,
                     )
-
-                    if evt is None:
-                        invalid_skipped += 1
-                        continue
-
-                    events.append(evt)
-                    details_fetched += 1
-
+                except CircuitOpenError:
+                    # upstream is down, not this RID: abort the run instead of dropping the rest
+                    raise
                 except Exception as e:
-                    details_failed += 1
                     logger.exception("RID %s failed: %r", rid, e)
-                    continue
+                    return "failed", None
+                return ("skipped", None) if evt is None else ("fetched", evt)
+
+            with ThreadPoolExecutor(max_workers=max(1, self.cfg.details_concurrency)) as ex:
+                futures = [ex.submit(fetch_one, rid) for rid in to_fetch]
+
+                # Workers share no state; results are tallied here, on the calling thread
+                for idx, fut in enumerate(as_completed(futures), start=1):
+                    try:
+                        status, evt = fut.result()
+                    except CircuitOpenError:
+                        for pending in futures:
+                            pending.cancel()
+                        raise
+                    counts[status] += 1
+                    if evt is not None:
+                        buffer.append(evt)
+                        if len(buffer) >= self.cfg.load_batch_size:
+                            load_stats.update(load_events(db, buffer, source_run_id))
+                            buffer.clear()
+
+                    if self.cfg.progress_every and (idx == 1 or idx % self.cfg.progress_every == 0 or idx == total):
+                        logger.info(
+                            "serviceDetails progress %d/%d (fetched=%d failed=%d skipped=%d)",
+                            idx,
+                            total,
+                            counts["fetched"],
+                            counts["failed"],
+                            counts["skipped"],
+                        )
 
-        logger.info("Loading %d events into DB...", len(events))
-        load_stats = load_events(db, events, source_run_id)
-        logger.info("Load complete: %s", load_stats)
+        logger.info("Loading remaining %d events into DB...", len(buffer))
+        load_stats.update(load_events(db, buffer, source_run_id))
+        logger.info("Load complete: %s", dict(load_stats))
 
         result = {
             "source": "hsp",
@@ -162,9 +205,9 @@ class HspSource(BaseSource):
             "days": days,
             "toc_filter": toc_filter or [],
             "rids_total": len(rids),
-            "details_fetched": details_fetched,
-            "details_failed": details_failed,
-            "invalid_skipped": invalid_skipped,
+            "details_fetched": counts["fetched"],
+            "details_failed": counts["failed"],
+            "invalid_skipped": counts["skipped"],
             **load_stats,
         }
 
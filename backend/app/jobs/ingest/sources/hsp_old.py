@@ -3,10 +3,12 @@ import time
 import uuid
 import logging
 import random
-from datetime import date as Date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date, timedelta
 from typing import Optional
 
 import httpx
+import orjson
 from sqlalchemy.orm import Session
 
 from app.jobs.ingest.sources.base import BaseSource
@@ -14,6 +16,8 @@ from app.jobs.ingest.types import CanonicalServiceEvent
 from app.jobs.ingest.utils.time import hhmm_to_dt, roll_if_next_day
 from app.jobs.ingest.utils.service_key import make_service_key
 from app.jobs.ingest.loader import load_events
+from app.jobs.ingest.sources.hsp.details import clean_str
+from app.jobs.ingest.sources.hsp.http import CircuitBreaker, CircuitOpenError, TokenBucket
 
 # ---- Logging ----
 logger = logging.getLogger(__name__)
@@ -65,38 +69,21 @@ def _time_windows(from_time: str, to_time: str, step_minutes: int) -> list[tuple
     """
     sh, sm = _parse_hhmm(from_time)
     eh, em = _parse_hhmm(to_time)
+    start = sh * 60 + sm
+    end = eh * 60 + em
 
-    start = datetime(2000, 1, 1, sh, sm)
-    end = datetime(2000, 1, 1, eh, em)
+    return [
+        (_fmt_hhmm(*divmod(cur, 60)), _fmt_hhmm(*divmod(min(cur + step_minutes, end), 60)))
+        for cur in range(start, end, step_minutes)
+    ]
 
-    windows: list[tuple[str, str]] = []
-    cur = start
-    while cur < end:
-        nxt = min(cur + timedelta(minutes=step_minutes), end)
-        windows.append((_fmt_hhmm(cur.hour, cur.minute), _fmt_hhmm(nxt.hour, nxt.minute)))
-        cur = nxt
-    return windows
 
-
-def _date_range(from_date: str, to_date: str) -> list[str]:
+def _date_range(from_date: str, to_date: str, only_weekday: bool = False) -> list[str]:
+    """ISO dates in [from_date, to_date]; Mon–Fri only when only_weekday."""
     d0 = Date.fromisoformat(from_date)
-    d1 = Date.fromisoformat(to_date)
-    out: list[str] = []
-    d = d0
-    while d <= d1:
-        out.append(d.isoformat())
-        d += timedelta(days=1)
-    return out
-
-
-def _weekday_only(dates: list[str]) -> list[str]:
-    """Filter ISO date strings to Mon–Fri."""
-    out: list[str] = []
-    for s in dates:
-        d = Date.fromisoformat(s)
-        if d.weekday() < 5:
-            out.append(s)
-    return out
+    days = (Date.fromisoformat(to_date) - d0).days + 1
+    dates = (d0 + timedelta(days=i) for i in range(days))
+    return [d.isoformat() for d in dates if not only_weekday or d.weekday() < 5]
 
 
 class HspSource(BaseSource):
@@ -125,22 +112,35 @@ class HspSource(BaseSource):
         self.metrics_read_timeout = float(os.getenv("HSP_METRICS_READ_TIMEOUT_SECONDS", "240"))
         self.details_read_timeout = float(os.getenv("HSP_DETAILS_READ_TIMEOUT_SECONDS", "60"))
 
+        # Connection pool (keep-alive reuse across the chunked/concurrent requests)
+        self.pool_max = int(os.getenv("HSP_POOL_MAX", "200"))
+        self.pool_keepalive = int(os.getenv("HSP_POOL_KEEPALIVE", "50"))
+        self.pool_keepalive_expiry = float(os.getenv("HSP_POOL_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
         # Chunking to reduce serviceMetrics response size / upstream load
         self.metrics_window_minutes = int(os.getenv("HSP_METRICS_WINDOW_MINUTES", "60"))
         self.metrics_filter_weekdays = os.getenv("HSP_METRICS_FILTER_WEEKDAYS", "1") == "1"
+        self.metrics_concurrency = int(os.getenv("HSP_METRICS_CONCURRENCY", "8"))
 
         # Politeness & limits
-        self.delay = float(os.getenv("HSP_REQUEST_DELAY_SECONDS", "0.15"))
+        self.bucket = TokenBucket(
+            float(os.getenv("HSP_RATE_PER_SECOND", "10")),
+            int(os.getenv("HSP_RATE_BURST", "10")),
+        )
         self.max_details = int(os.getenv("HSP_MAX_DETAILS", "0"))  # 0 = unlimited
 
         # Retry policy
         self.retries = int(os.getenv("HSP_RETRIES", "6"))
         self.backoff_base = float(os.getenv("HSP_BACKOFF_BASE_SECONDS", "1.5"))
+        self.breaker = CircuitBreaker(
+            int(os.getenv("HSP_BREAKER_FAILURES", "20")),
+            float(os.getenv("HSP_BREAKER_RESET_SECONDS", "30")),
+        )
         self.progress_every = int(os.getenv("HSP_PROGRESS_EVERY", "50"))
 
         logger.info(
             "HSP configured base_url=%s timeouts(connect=%.1f write=%.1f pool=%.1f read_metrics=%.1f read_details=%.1f) "
-            "metrics_window_minutes=%d filter_weekdays=%s delay=%.2f retries=%d backoff_base=%.2f max_details=%s",
+            "metrics_window_minutes=%d filter_weekdays=%s rate=%.1f/s retries=%d backoff_base=%.2f max_details=%s",
             self.base_url,
             self.connect_timeout,
             self.write_timeout,
@@ -149,7 +149,7 @@ class HspSource(BaseSource):
             self.details_read_timeout,
             self.metrics_window_minutes,
             self.metrics_filter_weekdays,
-            self.delay,
+            self.bucket.max_rate,
             self.retries,
             self.backoff_base,
             "unlimited" if self.max_details == 0 else str(self.max_details),
@@ -168,12 +168,19 @@ class HspSource(BaseSource):
             write=self.write_timeout,
             pool=self.pool_timeout,
         )
+        limits = httpx.Limits(
+            max_connections=self.pool_max,
+            max_keepalive_connections=self.pool_keepalive,
+            keepalive_expiry=self.pool_keepalive_expiry,
+        )
         return httpx.Client(
             base_url=self.base_url,
             auth=auth,
             timeout=timeout,
             headers={"Content-Type": "application/json"},
-            event_hooks={"request": [self._log_request]},
+            # Only pay for the per-request hook (auth masking, formatting) when it would log
+            event_hooks={"request": [self._log_request]} if logger.isEnabledFor(logging.DEBUG) else {},
+            transport=httpx.HTTPTransport(http2=True, retries=0, limits=limits),
         )
 
     def _sleep_backoff(self, attempt: int, path: str) -> None:
@@ -187,9 +194,12 @@ class HspSource(BaseSource):
         last_err: Exception | None = None
 
         for attempt in range(1, self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"POST {path} not attempted: upstream circuit open") from last_err
+            self.bucket.acquire()
             t0 = time.perf_counter()
             try:
-                r = client.post(path, json=payload)
+                r = client.post(path, content=orjson.dumps(payload))
                 elapsed = time.perf_counter() - t0
 
                 # Retryable gateway/rate-limit statuses
@@ -204,6 +214,8 @@ class HspSource(BaseSource):
                         elapsed,
                         snippet,
                     )
+                    if r.status_code in (429, 503) or "retry-after" in r.headers:
+                        self.bucket.shrink()
                     raise httpx.HTTPStatusError("Retryable status", request=r.request, response=r)
 
                 # Normal status handling
@@ -213,7 +225,9 @@ class HspSource(BaseSource):
                     logger.debug("POST %s completed in %.2fs status=%d", path, elapsed, r.status_code)
 
                 r.raise_for_status()
-                return r.json()
+                self.bucket.grow()
+                self.breaker.record_success()
+                return orjson.loads(r.content)
 
             except (httpx.ReadTimeout, httpx.ConnectTimeout) as e:
                 elapsed = time.perf_counter() - t0
@@ -258,6 +272,7 @@ class HspSource(BaseSource):
                     e,
                 )
 
+            self.breaker.record_failure()
             self._sleep_backoff(attempt, path)
 
         raise last_err  # type: ignore
@@ -287,11 +302,12 @@ class HspSource(BaseSource):
         if toc_filter:
             metrics_payload_base["toc_filter"] = toc_filter
 
-        dates = _date_range(from_date, to_date)
-
         # Optional: if caller asks WEEKDAY, skip weekend dates entirely (reduces calls)
-        if self.metrics_filter_weekdays and days.upper() == "WEEKDAY":
-            dates = _weekday_only(dates)
+        dates = _date_range(
+            from_date,
+            to_date,
+            only_weekday=self.metrics_filter_weekdays and days.upper() == "WEEKDAY",
+        )
 
         windows = _time_windows(from_time, to_time, self.metrics_window_minutes)
 
@@ -304,21 +320,26 @@ class HspSource(BaseSource):
             total_requests,
         )
 
+        tasks = [(d, w_from, w_to) for d in dates for w_from, w_to in windows]
+
+        def fetch_chunk(req_idx: int, task: tuple[str, str, str]) -> list[dict]:
+            d, w_from, w_to = task
+            payload = {
+                **metrics_payload_base,
+                "from_date": d,
+                "to_date": d,
+                "from_time": w_from,
+                "to_time": w_to,
+            }
+            logger.info("serviceMetrics chunk %d/%d date=%s %s-%s", req_idx, total_requests, d, w_from, w_to)
+            mj = self._post_with_retry(client, "/serviceMetrics", payload)
+            return mj.get("Services", []) or []
+
+        # Chunks are independent; ex.map keeps the merged result in (date, window) order
         merged_services: list[dict] = []
-        req_idx = 0
-        for d in dates:
-            for w_from, w_to in windows:
-                req_idx += 1
-                payload = {
-                    **metrics_payload_base,
-                    "from_date": d,
-                    "to_date": d,
-                    "from_time": w_from,
-                    "to_time": w_to,
-                }
-                logger.info("serviceMetrics chunk %d/%d date=%s %s-%s", req_idx, total_requests, d, w_from, w_to)
-                mj = self._post_with_retry(client, "/serviceMetrics", payload)
-                merged_services.extend(mj.get("Services", []) or [])
+        with ThreadPoolExecutor(max_workers=max(1, self.metrics_concurrency)) as ex:
+            for services in ex.map(fetch_chunk, range(1, total_requests + 1), tasks):
+                merged_services.extend(services)
 
         logger.info("serviceMetrics chunks complete: merged_services=%d", len(merged_services))
         return merged_services
@@ -374,24 +395,26 @@ class HspSource(BaseSource):
                 toc_filter=toc_filter,
             )
 
-        rids: list[str] = []
         service_templates: dict[str, tuple[str, str, str]] = {}  # rid -> (gbtt_ptd, gbtt_pta, toc)
 
         for s in services:
             attrs = s.get("serviceAttributesMetrics", {}) or {}
-            gbtt_ptd = (attrs.get("gbtt_ptd") or "").strip()  # HHMM at origin
-            gbtt_pta = (attrs.get("gbtt_pta") or "").strip()  # HHMM at destination
-            toc = (attrs.get("toc_code") or "").strip()
-            rid_list = _as_list(attrs.get("rids"))
-
-            for rid in rid_list:
-                if not rid:
-                    continue
-                # De-dupe (chunking can yield duplicates)
-                if rid in service_templates:
-                    continue
-                rids.append(rid)
-                service_templates[rid] = (gbtt_ptd, gbtt_pta, toc)
+            template = (
+                clean_str(attrs.get("gbtt_ptd")),  # HHMM at origin
+                clean_str(attrs.get("gbtt_pta")),  # HHMM at destination
+                clean_str(attrs.get("toc_code")),
+            )
+            # De-dupe (chunking can yield duplicates); first occurrence wins
+            for rid in _as_list(attrs.get("rids")):
+                if rid:
+                    service_templates.setdefault(rid, template)
+
+        # dicts keep insertion order, so this is first-seen RID order. The templates are
+        # transposed into columns aligned with rids so the details loop indexes by position.
+        rids = list(service_templates)
+        tmpl_ptd, tmpl_pta, tmpl_toc = (
+            map(list, zip(*service_templates.values())) if rids else ([], [], [])
+        )
 
         logger.info("serviceMetrics produced %d unique RIDs (from merged_services=%d)", len(rids), len(services))
 
@@ -425,14 +448,11 @@ class HspSource(BaseSource):
                         invalid_skipped,
                     )
 
-                if self.delay > 0:
-                    time.sleep(self.delay)
-
                 try:
                     details_json = self._post_with_retry(details_client, "/serviceDetails", {"rid": rid})
                     data = details_json.get("serviceAttributesDetails", {}) or {}
 
-                    dos = (data.get("date_of_service") or "").strip()  # YYYY-MM-DD
+                    dos = clean_str(data.get("date_of_service"))  # YYYY-MM-DD
                     if not dos:
                         invalid_skipped += 1
                         logger.debug("RID %s skipped: missing date_of_service", rid)
@@ -440,13 +460,18 @@ class HspSource(BaseSource):
 
                     service_date = Date.fromisoformat(dos)
 
-                    toc = (data.get("toc_code") or "").strip()
+                    toc = clean_str(data.get("toc_code"))
                     if not toc:
-                        toc = service_templates.get(rid, ("", "", ""))[2]
+                        toc = tmpl_toc[idx - 1]
 
-                    locs = data.get("locations", []) or []
-                    origin_row = next((x for x in locs if x.get("location") == from_loc), None)
-                    dest_row = next((x for x in locs if x.get("location") == to_loc), None)
+                    # One pass over the calling points; first occurrence wins, as next() did
+                    locs_by_code: dict[str, dict] = {}
+                    for x in data.get("locations", []) or []:
+                        code = x.get("location")
+                        if code:
+                            locs_by_code.setdefault(code, x)
+                    origin_row = locs_by_code.get(from_loc)
+                    dest_row = locs_by_code.get(to_loc)
 
                     if not origin_row or not dest_row:
                         invalid_skipped += 1
@@ -459,8 +484,8 @@ class HspSource(BaseSource):
                         continue
 
                     # Scheduled times (fallback to metrics values)
-                    gbtt_ptd = (origin_row.get("gbtt_ptd") or "").strip() or service_templates.get(rid, ("", "", ""))[0]
-                    gbtt_pta = (dest_row.get("gbtt_pta") or "").strip() or service_templates.get(rid, ("", "", ""))[1]
+                    gbtt_ptd = clean_str(origin_row.get("gbtt_ptd")) or tmpl_ptd[idx - 1]
+                    gbtt_pta = clean_str(dest_row.get("gbtt_pta")) or tmpl_pta[idx - 1]
 
                     sched_dep = hhmm_to_dt(service_date, gbtt_ptd)
                     if sched_dep is None:
@@ -472,7 +497,7 @@ class HspSource(BaseSource):
                     sched_arr = roll_if_next_day(sched_dep, sched_arr)
 
                     # Actual arrival at destination
-                    actual_ta = (dest_row.get("actual_ta") or "").strip()
+                    actual_ta = clean_str(dest_row.get("actual_ta"))
                     act_arr = hhmm_to_dt(service_date, actual_ta)
                     act_arr = roll_if_next_day(sched_dep, act_arr)
 
@@ -509,6 +534,9 @@ class HspSource(BaseSource):
                     )
                     details_fetched += 1
 
+                except CircuitOpenError:
+                    # upstream is down, not this RID: abort the run instead of dropping the rest
+                    raise
                 except Exception as e:
                     details_failed += 1
                     logger.exception("RID %s failed: %r", rid, e)
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class CanonicalServiceEvent:
     # In the future, you can persist these in DB if you add columns
     source: str                      # "hsp"
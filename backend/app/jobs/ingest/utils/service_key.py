@@ -1,5 +1,7 @@
 import hashlib
 
 def make_service_key(origin: str, destination: str, operator: str, service_date: str, sched_dep_iso: str) -> str:
+    # Internal dedup/join key, not a security boundary: BLAKE2b-128 is cheaper than SHA-1 here.
+    # Changing this function means re-keying stored rows (see alembic d5f83b1a06c4).
     raw = f"{origin}|{destination}|{operator}|{service_date}|{sched_dep_iso}"
-    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
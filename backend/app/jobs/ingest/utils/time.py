@@ -1,4 +1,5 @@
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
 LONDON = ZoneInfo("Europe/London")
@@ -11,11 +12,19 @@ def hhmm_to_dt(service_date: date, hhmm: str):
     hhmm = (hhmm or "").strip()
     if not hhmm:
         return None
-    if len(hhmm) != 4 or not hhmm.isdigit():
+    return _hhmm_to_dt_cached(service_date, hhmm)
+
+# A run's RIDs share a handful of service dates and timetable minutes; datetimes are immutable
+@lru_cache(maxsize=8192)
+def _hhmm_to_dt_cached(service_date: date, hhmm: str) -> datetime:
+    b = hhmm.encode()
+    if len(b) != 4 or not b.isdigit():
         raise ValueError(f"Bad HHMM value: {hhmm}")
 
-    h = int(hhmm[:2])
-    m = int(hhmm[2:])
+    h = (b[0] - 48) * 10 + (b[1] - 48)
+    m = (b[2] - 48) * 10 + (b[3] - 48)
+    if h > 23 or m > 59:
+        raise ValueError(f"Bad HHMM value: {hhmm}")
     return datetime(service_date.year, service_date.month, service_date.day, h, m, tzinfo=LONDON)
 
 def roll_if_next_day(dep: datetime, maybe: datetime | None):
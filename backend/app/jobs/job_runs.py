@@ -0,0 +1,48 @@
+"""
+job_runs bookkeeping shared by the ingest, rollup and compute jobs.
+
+start_job commits the "running" row straight away so it is visible while the job runs;
+finish_job merges meta_updates into meta server-side (jsonb ||), so the row is never read back.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+_START_JOB = text(
+    """
+    INSERT INTO job_runs (run_id, job_name, status, meta)
+    VALUES (:run_id, :job_name, 'running', (:meta)::jsonb)
+    """
+)
+
+_FINISH_JOB = text(
+    """
+    UPDATE job_runs
+    SET status = :status,
+        ended_at = NOW(),
+        meta = COALESCE(meta, '{}'::jsonb) || (:patch)::jsonb
+    WHERE run_id = :run_id
+    """
+)
+
+
+def start_job(db: Session, job_name: str, meta: dict) -> uuid.UUID:
+    run_id = uuid.uuid4()
+    db.execute(_START_JOB, {"run_id": run_id, "job_name": job_name, "meta": json.dumps(meta)})
+    db.commit()
+    return run_id
+
+
+def finish_job(db: Session, run_id: uuid.UUID, status: str, meta_updates: dict, *, commit: bool = True) -> None:
+    """
+    Set the final status/ended_at and merge meta_updates into meta.
+    commit=False lets the caller commit it together with its own last statements.
+    """
+    db.execute(_FINISH_JOB, {"run_id": run_id, "status": status, "patch": json.dumps(meta_updates)})
+    if commit:
+        db.commit()
@@ -11,8 +11,14 @@ Metrics:
   n_disrupted     = cancelled OR delayed_gt5
 
 Notes:
-- dep_hhmm is derived from scheduled_departure_ts using Postgres to_char(..., 'HH24MI')
+- dep_hhmm is the generated raw_service_events.dep_hhmm column: scheduled_departure_ts as
+  Europe/London HHMM
 - day_of_week uses EXTRACT(DOW FROM service_date) giving 0=Sunday..6=Saturday
+- statement-level triggers on raw_service_events (alembic a93d5e0c7b14) already apply each
+  ingest's deltas to daily_slot_agg; this job rewrites absolute counts as a reconciliation
+  pass (e.g. after backfills, or if a concurrent ingest raced a previous rollup)
+- with ingested_since, only service_dates that received raw rows after that watermark are
+  re-aggregated (all of their rows, so the upserted counts stay complete)
 
 Usage:
   run_daily_slot_aggs(db, from_date="2026-01-01", to_date="2026-01-07")
@@ -21,9 +27,10 @@ Usage:
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
-from sqlalchemy import text
+from sqlalchemy import TextClause, text
 from sqlalchemy.orm import Session
 
 
@@ -31,74 +38,127 @@ from sqlalchemy.orm import Session
 class DailySlotAggResult:
     from_date: str
     to_date: str
-    rows_affected: int
+    rows_upserted: int   # slot rows written (inserted, or updated because a count changed)
+    rows_inserted: int   # of which new
 
 
-_DAILY_SLOT_AGG_SQL = text(
+_SLOT_FILTERS = ("operator", "origin", "destination")
+
+# overlap covers ingest transactions that committed after the watermark was read
+# with an earlier now(); re-aggregating a date twice is harmless
+_INGESTED_SINCE = """r.service_date IN (
+                    SELECT t.service_date
+                    FROM raw_service_events t
+                    WHERE t.ingested_at > (:ingested_since)::timestamptz - INTERVAL '10 minutes'
+                      AND t.service_date >= :from_date
+                      AND t.service_date <= :to_date
+                )"""
+
+
+@lru_cache(maxsize=None)
+def _daily_slot_agg_sql(filters: tuple[str, ...], incremental: bool) -> TextClause:
     """
-    INSERT INTO daily_slot_agg (
-        service_date,
-        operator,
-        origin,
-        destination,
-        dep_hhmm,
-        day_of_week,
-        n_services,
-        n_cancelled,
-        n_delayed_gt5,
-        n_disrupted
+    One statement per filter shape, holding only the predicates that apply, so the planner
+    sees plain equalities instead of "(:p IS NULL OR col = :p)".
+    """
+    conds = ["r.service_date >= :from_date", "r.service_date <= :to_date"]
+    conds += [f"r.{col} = (:{col})::text" for col in filters]
+    if incremental:
+        conds.append(_INGESTED_SINCE)
+
+    return text(
+        """
+        WITH agg AS (
+            SELECT
+                r.service_date                                                         AS service_date,
+                r.operator                                                             AS operator,
+                r.origin                                                               AS origin,
+                r.destination                                                          AS destination,
+                r.dep_hhmm                                                             AS dep_hhmm,
+                -- computed per group, not per row: service_date is grouped on
+                EXTRACT(DOW FROM r.service_date)::int                                  AS day_of_week,
+                COUNT(*)::int                                                          AS n_services,
+                COUNT(*) FILTER (WHERE r.cancelled)::int                               AS n_cancelled,
+                -- NULL delay compares as not > 5, so no IS NOT NULL guard is needed
+                COUNT(*) FILTER (WHERE NOT r.cancelled AND r.arrival_delay_minutes > 5)::int AS n_delayed_gt5
+            FROM raw_service_events r
+            WHERE {where}
+            GROUP BY
+                r.service_date,
+                r.operator,
+                r.origin,
+                r.destination,
+                r.dep_hhmm
+        ),
+        upserted AS (
+            INSERT INTO daily_slot_agg (
+                service_date,
+                operator,
+                origin,
+                destination,
+                dep_hhmm,
+                day_of_week,
+                n_services,
+                n_cancelled,
+                n_delayed_gt5,
+                n_disrupted
+            )
+            SELECT
+                service_date,
+                operator,
+                origin,
+                destination,
+                dep_hhmm,
+                day_of_week,
+                n_services,
+                n_cancelled,
+                n_delayed_gt5,
+                -- delayed_gt5 already excludes cancelled services, so the two are disjoint
+                n_cancelled + n_delayed_gt5
+            FROM agg
+            -- same key order as the raw_service_events trigger upserts, so a rollup and a
+            -- concurrent ingest lock shared slot rows in the same order instead of deadlocking
+            ORDER BY service_date, operator, origin, destination, dep_hhmm
+            ON CONFLICT (service_date, operator, origin, destination, dep_hhmm)
+            DO UPDATE SET
+                day_of_week   = EXCLUDED.day_of_week,
+                n_services    = EXCLUDED.n_services,
+                n_cancelled   = EXCLUDED.n_cancelled,
+                n_delayed_gt5 = EXCLUDED.n_delayed_gt5,
+                n_disrupted   = EXCLUDED.n_disrupted
+            -- re-aggregating an unchanged day is the common case; skip writing a new tuple for it
+            -- (day_of_week follows service_date, which is part of the key)
+            WHERE daily_slot_agg.n_services    IS DISTINCT FROM EXCLUDED.n_services
+               OR daily_slot_agg.n_cancelled   IS DISTINCT FROM EXCLUDED.n_cancelled
+               OR daily_slot_agg.n_delayed_gt5 IS DISTINCT FROM EXCLUDED.n_delayed_gt5
+               OR daily_slot_agg.n_disrupted   IS DISTINCT FROM EXCLUDED.n_disrupted
+            -- xmax is 0 only for freshly inserted tuples; updated ones carry the updating xid
+            RETURNING (xmax = 0) AS was_insert
+        )
+        SELECT
+            COUNT(*)::int                            AS rows_upserted,
+            COALESCE(SUM(was_insert::int), 0)::int   AS rows_inserted
+        FROM upserted
+        """.format(where="\n              AND ".join(conds))
     )
+
+
+# Transaction-local (set_config(..., true) == SET LOCAL). Room for the hash aggregate to stay in
+# memory, and per-partition aggregation since the GROUP BY includes the partition key.
+# No parallel-worker settings: Postgres never parallelizes a statement that writes.
+_ROLLUP_SETTINGS_SQL = text(
+    """
     SELECT
-        r.service_date                                             AS service_date,
-        r.operator                                                 AS operator,
-        r.origin                                                   AS origin,
-        r.destination                                              AS destination,
-        to_char(r.scheduled_departure_ts, 'HH24MI')                AS dep_hhmm,
-        EXTRACT(DOW FROM r.service_date)::int                      AS day_of_week,
-        COUNT(*)::int                                              AS n_services,
-        SUM(CASE WHEN r.cancelled THEN 1 ELSE 0 END)::int          AS n_cancelled,
-        SUM(
-            CASE
-                WHEN NOT r.cancelled
-                 AND r.arrival_delay_minutes IS NOT NULL
-                 AND r.arrival_delay_minutes > 5
-                THEN 1 ELSE 0
-            END
-        )::int                                                     AS n_delayed_gt5,
-        SUM(
-            CASE
-                WHEN r.cancelled
-                 OR (NOT r.cancelled
-                     AND r.arrival_delay_minutes IS NOT NULL
-                     AND r.arrival_delay_minutes > 5)
-                THEN 1 ELSE 0
-            END
-        )::int                                                     AS n_disrupted
-    FROM raw_service_events r
-    WHERE r.service_date >= :from_date
-      AND r.service_date <= :to_date
-      AND ((:operator)::text IS NULL OR r.operator = (:operator)::text)
-      AND ((:origin)::text IS NULL OR r.origin = (:origin)::text)
-      AND ((:destination)::text IS NULL OR r.destination = (:destination)::text)
-    GROUP BY
-        r.service_date,
-        r.operator,
-        r.origin,
-        r.destination,
-        to_char(r.scheduled_departure_ts, 'HH24MI'),
-        EXTRACT(DOW FROM r.service_date)::int
-    ON CONFLICT (service_date, operator, origin, destination, dep_hhmm)
-    DO UPDATE SET
-        day_of_week   = EXCLUDED.day_of_week,
-        n_services    = EXCLUDED.n_services,
-        n_cancelled   = EXCLUDED.n_cancelled,
-        n_delayed_gt5 = EXCLUDED.n_delayed_gt5,
-        n_disrupted   = EXCLUDED.n_disrupted
-    ;
+        set_config('work_mem', '256MB', true),
+        set_config('enable_partitionwise_aggregate', 'on', true)
     """
 )
 
 
+def _active_filters(**values: Optional[str]) -> tuple[str, ...]:
+    return tuple(col for col in _SLOT_FILTERS if values[col] is not None)
+
+
 def run_daily_slot_aggs(
     db: Session,
     *,
@@ -107,6 +167,7 @@ def run_daily_slot_aggs(
     operator: Optional[str] = None,
     origin: Optional[str] = None,
     destination: Optional[str] = None,
+    ingested_since: Optional[str] = None,
     commit: bool = True,
 ) -> DailySlotAggResult:
     """
@@ -116,24 +177,34 @@ def run_daily_slot_aggs(
       db: SQLAlchemy Session
       from_date/to_date: YYYY-MM-DD strings
       operator/origin/destination: optional filters
+      ingested_since: optional ISO timestamp; restricts the rollup to dates touched after it
       commit: commit transaction if True (default)
 
     Returns:
-      DailySlotAggResult with rows_affected (as reported by driver; may be -1 on some setups)
+      DailySlotAggResult with rows upserted / newly inserted, counted via RETURNING
     """
-    res = db.execute(
-        _DAILY_SLOT_AGG_SQL,
+    db.execute(_ROLLUP_SETTINGS_SQL)
+    counts = db.execute(
+        _daily_slot_agg_sql(
+            _active_filters(operator=operator, origin=origin, destination=destination),
+            ingested_since is not None,
+        ),
         {
             "from_date": from_date,
             "to_date": to_date,
             "operator": operator,
             "origin": origin,
             "destination": destination,
+            "ingested_since": ingested_since,
         },
-    )
+    ).one()
 
     if commit:
         db.commit()
 
-    # rowcount can be -1 depending on driver/execution plan; still useful when available.
-    return DailySlotAggResult(from_date=from_date, to_date=to_date, rows_affected=res.rowcount)
+    return DailySlotAggResult(
+        from_date=from_date,
+        to_date=to_date,
+        rows_upserted=counts.rows_upserted,
+        rows_inserted=counts.rows_inserted,
+    )
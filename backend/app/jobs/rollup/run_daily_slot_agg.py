@@ -1,88 +1,70 @@
 import argparse
-import uuid
-from datetime import datetime
+from dataclasses import asdict, dataclass
 from typing import Optional
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.db import SessionLocal
-from app.models.job_runs import JobRun
+from app.jobs.job_runs import finish_job, start_job
 from app.jobs.rollup.daily_slot_agg import run_daily_slot_aggs
 
 
-def _count_daily_slot_aggs(
-    db: Session,
-    *,
-    from_date: str,
-    to_date: str,
-    operator: Optional[str],
-    origin: Optional[str],
-    destination: Optional[str],
-) -> int:
-    """
-    Rowcount for INSERT..ON CONFLICT is unreliable across drivers, so we do a
-    before/after COUNT(*) for the range/filters.
-    """
-    q = text(
-        """
-        SELECT COUNT(*)
-        FROM daily_slot_agg
-        WHERE service_date >= :from_date
-          AND service_date <= :to_date
-          AND ((:operator)::text IS NULL OR operator = (:operator)::text)
-          AND ((:origin)::text IS NULL OR origin = (:origin)::text)
-          AND ((:destination)::text IS NULL OR destination = (:destination)::text)
-        """
-    )
-    return int(
-        db.execute(
-            q,
-            {
-                "from_date": from_date,
-                "to_date": to_date,
-                "operator": operator,
-                "origin": origin,
-                "destination": destination,
-            },
-        ).scalar_one()
-    )
-
-
-def main():
-    p = argparse.ArgumentParser(description="Roll up raw_service_events into daily_slot_agg")
+@dataclass(frozen=True)
+class RollupArgs:
+    from_date: str
+    to_date: str
+    operator: Optional[str] = None
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    # only re-aggregate dates with raw rows ingested since the last covering successful run
+    incremental: bool = False
 
-    p.add_argument("--from-date", required=True, help="YYYY-MM-DD")
-    p.add_argument("--to-date", required=True, help="YYYY-MM-DD")
 
-    # Optional filters (mirror ingestion-ish args but without times/days)
-    p.add_argument("--operator", help="Optional operator filter (e.g. GW)")
-    p.add_argument("--from-loc", dest="origin", help="Optional origin CRS filter (e.g. RDG)")
-    p.add_argument("--to-loc", dest="destination", help="Optional destination CRS filter (e.g. PAD)")
+# Highest watermark of a successful run with the same filters whose range covers this one:
+# every raw row ingested up to it, for dates in this range, has already been rolled up.
+_PREVIOUS_WATERMARK_SQL = text(
+    """
+    SELECT MAX((meta->>'max_ingested_at')::timestamptz)
+    FROM job_runs
+    WHERE job_name = 'rollup_daily_slot_agg'
+      AND status = 'success'
+      AND meta ? 'max_ingested_at'
+      AND meta->'args'->>'from_date' <= :from_date
+      AND meta->'args'->>'to_date' >= :to_date
+      AND meta->'args'->>'operator' IS NOT DISTINCT FROM (:operator)::text
+      AND meta->'args'->>'origin' IS NOT DISTINCT FROM (:origin)::text
+      AND meta->'args'->>'destination' IS NOT DISTINCT FROM (:destination)::text
+    """
+)
 
-    args = p.parse_args()
+_MAX_INGESTED_AT_SQL = text("SELECT MAX(ingested_at) FROM raw_service_events")
 
-    db: Session = SessionLocal()
-    run_id = uuid.uuid4()
 
-    job = JobRun(
-        run_id=run_id,
-        job_name="rollup_daily_slot_agg",
-        status="running",
-        meta={"args": vars(args)},
-    )
-    db.add(job)
-    db.commit()
+def run_rollup(args: RollupArgs, db: Session) -> dict:
+    """
+    Roll up raw_service_events into daily_slot_agg with job_runs bookkeeping.
+    Callable in-process (e.g. from the backfill driver) as well as from the CLI.
+    """
+    run_id = start_job(db, "rollup_daily_slot_agg", {"args": asdict(args)})
 
     try:
-        before = _count_daily_slot_aggs(
-            db,
-            from_date=args.from_date,
-            to_date=args.to_date,
-            operator=args.operator,
-            origin=args.origin,
-            destination=args.destination,
-        )
+        ingested_since = None
+        if args.incremental:
+            prev = db.execute(
+                _PREVIOUS_WATERMARK_SQL,
+                {
+                    "from_date": args.from_date,
+                    "to_date": args.to_date,
+                    "operator": args.operator,
+                    "origin": args.origin,
+                    "destination": args.destination,
+                },
+            ).scalar_one()
+            ingested_since = prev.isoformat() if prev is not None else None
+
+        # read before the upsert so rows ingested while it runs are picked up next time
+        max_ingested_at = db.execute(_MAX_INGESTED_AT_SQL).scalar_one()
 
         result = run_daily_slot_aggs(
             db,
@@ -91,16 +73,9 @@ def main():
             operator=args.operator,
             origin=args.origin,
             destination=args.destination,
-            commit=True,
-        )
-
-        after = _count_daily_slot_aggs(
-            db,
-            from_date=args.from_date,
-            to_date=args.to_date,
-            operator=args.operator,
-            origin=args.origin,
-            destination=args.destination,
+            ingested_since=ingested_since,
+            # committed together with the job row below: the data and its watermark land atomically
+            commit=False,
         )
 
         result_payload = {
@@ -109,29 +84,44 @@ def main():
             "operator": args.operator,
             "origin": args.origin,
             "destination": args.destination,
-            # counts that work regardless of rowcount support
-            "rows_before": before,
-            "rows_after": after,
-            "rows_net_new": max(0, after - before),
+            "rows_upserted": result.rows_upserted,
+            "rows_net_new": result.rows_inserted,
+            "ingested_since": ingested_since,
+            "max_ingested_at": max_ingested_at.isoformat() if max_ingested_at is not None else None,
         }
 
-        job = db.get(JobRun, run_id)
-        job.status = "success"
-        job.ended_at = datetime.utcnow()
-        job.meta = {**(job.meta or {}), **result_payload}
-        db.commit()
+        finish_job(db, run_id, "success", result_payload)
 
-        print(result_payload)
+        return result_payload
 
     except Exception as e:
         db.rollback()
-        job = db.get(JobRun, run_id)
-        job.status = "fail"
-        job.ended_at = datetime.utcnow()
-        job.meta = {**(job.meta or {}), "error": repr(e)}
-        db.commit()
+        finish_job(db, run_id, "fail", {"error": repr(e)})
         raise
 
+
+def main():
+    p = argparse.ArgumentParser(description="Roll up raw_service_events into daily_slot_agg")
+
+    p.add_argument("--from-date", required=True, help="YYYY-MM-DD")
+    p.add_argument("--to-date", required=True, help="YYYY-MM-DD")
+
+    # Optional filters (mirror ingestion-ish args but without times/days)
+    p.add_argument("--operator", help="Optional operator filter (e.g. GW)")
+    p.add_argument("--from-loc", dest="origin", help="Optional origin CRS filter (e.g. RDG)")
+    p.add_argument("--to-loc", dest="destination", help="Optional destination CRS filter (e.g. PAD)")
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-aggregate dates with raw rows ingested since the last successful run covering this range",
+    )
+
+    args = p.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        result_payload = run_rollup(RollupArgs(**vars(args)), db)
+        print(result_payload)
     finally:
         db.close()
 
@@ -1,8 +1,25 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.api.v1.routes.health import router as health_router
 from app.api.v1.routes.reliability import router as reliability_router
+from app.core.db import DATABASE_URL
+from app.core.result_cache import listen_for_slot_metrics_refresh
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = asyncio.create_task(listen_for_slot_metrics_refresh(DATABASE_URL))
+    try:
+        yield
+    finally:
+        listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await listener
 
 
-app = FastAPI(title="RailWise MVP API")
+app = FastAPI(title="RailWise MVP API", lifespan=lifespan)
 app.include_router(health_router, prefix="/v1")
 app.include_router(reliability_router)
\ No newline at end of file
@@ -1,29 +1,62 @@
 import uuid
-from sqlalchemy import Column, Date, DateTime, Integer, Boolean, Text
+from sqlalchemy import Column, Computed, Date, DateTime, Index, Integer, Boolean, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.core.db import Base
 
 class RawServiceEvent(Base):
     __tablename__ = "raw_service_events"
+    # Monthly partitions (raw_service_events_yYYYYmMM), created by rse_ensure_partitions
+    __table_args__ = {"postgresql_partition_by": "RANGE (service_date)"}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
-    service_date = Column(Date, nullable=False, index=True)
+    # partition key, so it is part of every unique key
+    service_date = Column(Date, primary_key=True, index=True)
     operator = Column(Text, nullable=False, index=True)
     origin = Column(Text, nullable=False, index=True)
     destination = Column(Text, nullable=False, index=True)
 
     scheduled_departure_ts = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Europe/London HHMM slot key for the rollup; spelled with date_part/lpad because a
+    # generated column must be IMMUTABLE and to_char() is only STABLE
+    dep_hhmm = Column(
+        Text,
+        Computed(
+            "lpad(date_part('hour', scheduled_departure_ts AT TIME ZONE 'Europe/London')::int::text, 2, '0') || "
+            "lpad(date_part('minute', scheduled_departure_ts AT TIME ZONE 'Europe/London')::int::text, 2, '0')",
+            persisted=True,
+        ),
+    )
     scheduled_arrival_ts = Column(DateTime(timezone=True), nullable=True)
     actual_arrival_ts = Column(DateTime(timezone=True), nullable=True)
 
     cancelled = Column(Boolean, nullable=False, default=False)
     arrival_delay_minutes = Column(Integer, nullable=True)
 
-    service_key = Column(Text, nullable=False, index=True, unique=True)
+    service_key = Column(Text, nullable=False)
 
     source_run_id = Column(UUID(as_uuid=True), nullable=False, index=True)
-    ingested_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     source_event_id = Column(Text, nullable=True, index=True)
     sourced = Column(Text, nullable=False, index=True)
+
+
+# service_key hashes service_date, so this is as strict as service_key alone
+Index(
+    "ix_raw_service_events_service_key",
+    RawServiceEvent.service_key,
+    RawServiceEvent.service_date,
+    unique=True,
+)
+
+# Covers the daily_slot_agg rollup's GROUP BY key and aggregated columns
+Index(
+    "ix_raw_service_events_slot",
+    RawServiceEvent.service_date,
+    RawServiceEvent.operator,
+    RawServiceEvent.origin,
+    RawServiceEvent.destination,
+    RawServiceEvent.dep_hhmm,
+    postgresql_include=["cancelled", "arrival_delay_minutes"],
+)
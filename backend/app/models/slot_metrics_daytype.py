@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Date, Float, Integer, Text, DateTime, func
+from sqlalchemy import Column, Date, Float, Index, Integer, Text, DateTime, func
 from app.core.db import Base
 
 class SlotMetricsDayType(Base):
@@ -21,4 +21,24 @@ class SlotMetricsDayType(Base):
     effective_sample_size = Column(Float, nullable=False)
     confidence_band = Column(Text, nullable=False)
 
-    computed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# Covering index for the /v1/reliability slot/baseline lookups (Index Only Scan)
+Index(
+    "ix_smd_lookup",
+    SlotMetricsDayType.metric_date,
+    SlotMetricsDayType.model_version,
+    SlotMetricsDayType.origin,
+    SlotMetricsDayType.destination,
+    SlotMetricsDayType.day_type,
+    SlotMetricsDayType.operator,
+    SlotMetricsDayType.dep_hhmm,
+    postgresql_include=[
+        "disruption_prob",
+        "cancellation_prob",
+        "reliability_score",
+        "effective_sample_size",
+        "confidence_band",
+    ],
+)
\ No newline at end of file
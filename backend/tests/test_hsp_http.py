@@ -0,0 +1,120 @@
+import pytest
+
+from app.jobs.ingest.sources.hsp import http
+from app.jobs.ingest.sources.hsp.http import CircuitBreaker, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(http.time, "monotonic", c.monotonic)
+    monkeypatch.setattr(http.time, "sleep", c.sleep)
+    return c
+
+
+def test_bucket_serves_burst_without_waiting(clock):
+    bucket = TokenBucket(rate_per_sec=2.0, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_bucket_waits_for_refill_once_empty(clock):
+    bucket = TokenBucket(rate_per_sec=2.0, burst=1)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_bucket_disabled_when_rate_not_positive(clock):
+    bucket = TokenBucket(rate_per_sec=0, burst=1)
+    for _ in range(10):
+        bucket.acquire()
+    bucket.shrink()
+    assert clock.sleeps == []
+    assert bucket.rate == 0
+
+
+def test_bucket_shrink_halves_rate_down_to_min():
+    bucket = TokenBucket(rate_per_sec=8.0, burst=1, min_rate=3.0)
+    bucket.shrink()
+    assert bucket.rate == 4.0
+    bucket.shrink()
+    assert bucket.rate == 3.0
+
+
+def test_bucket_grow_recovers_after_run_of_successes():
+    bucket = TokenBucket(rate_per_sec=10.0, burst=1, grow_after=3)
+    bucket.shrink()
+    assert bucket.rate == 5.0
+    bucket.grow()
+    bucket.grow()
+    assert bucket.rate == 5.0
+    bucket.grow()
+    assert bucket.rate == 6.0
+
+
+def test_bucket_grow_never_exceeds_configured_rate():
+    bucket = TokenBucket(rate_per_sec=10.0, burst=1, grow_after=1)
+    bucket.shrink()
+    for _ in range(20):
+        bucket.grow()
+    assert bucket.rate == 10.0
+
+
+def test_breaker_opens_after_threshold_and_resets(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 30.0
+    assert breaker.allow()
+    # half-open: a single further failure re-opens it
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_breaker_success_clears_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_breaker_disabled_when_threshold_not_positive(clock):
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_post_with_retry_raises_circuit_open_without_requesting(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+
+    class NoCalls:
+        timeout = None
+
+        def post(self, *args, **kwargs):
+            raise AssertionError("request sent while circuit open")
+
+    cfg = type("Cfg", (), {"retries": 3})()
+    with pytest.raises(http.CircuitOpenError):
+        http.post_with_retry(cfg, NoCalls(), "/serviceDetails", {"rid": "1"}, breaker=breaker)
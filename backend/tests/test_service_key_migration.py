@@ -0,0 +1,40 @@
+import importlib.util
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from app.jobs.ingest.utils.time import hhmm_to_dt
+
+_PATH = next((Path(__file__).parents[1] / "alembic" / "versions").glob("d5f83b1a06c4_*.py"))
+_spec = importlib.util.spec_from_file_location("d5f83b1a06c4", _PATH)
+migration = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migration)
+
+
+def _as_read_back(dt: datetime) -> datetime:
+    # timestamptz comes back from the driver in the session time zone (UTC here)
+    return dt.astimezone(timezone.utc)
+
+
+def test_regular_departure_has_single_rendering():
+    built = hhmm_to_dt(date(2026, 7, 1), "0815")
+    assert migration._sched_dep_isos(_as_read_back(built)) == [built.isoformat()]
+
+
+def test_gmt_departure_has_single_rendering():
+    built = hhmm_to_dt(date(2026, 1, 15), "0815")
+    assert migration._sched_dep_isos(_as_read_back(built)) == [built.isoformat()]
+
+
+def test_spring_forward_gap_departure_includes_ingest_rendering():
+    # 01:30 does not exist on 2026-03-29 in London; ingest keeps the pre-transition offset
+    built = hhmm_to_dt(date(2026, 3, 29), "0130")
+    assert built.isoformat() == "2026-03-29T01:30:00+00:00"
+
+    isos = migration._sched_dep_isos(_as_read_back(built))
+    assert isos[0] == "2026-03-29T02:30:00+01:00"
+    assert built.isoformat() in isos
+
+
+def test_autumn_ambiguous_departure_matches_ingest_rendering():
+    built = hhmm_to_dt(date(2026, 10, 25), "0130")
+    assert migration._sched_dep_isos(_as_read_back(built)) == [built.isoformat()]